@@ -1,34 +1,108 @@
 import asyncio
-import datetime as dt
+import functools
 import logging
 import os
 import sys
 import time
 import uuid
+from collections import Counter
 from typing import List
 
 import discord
-import requests
 from aiohttp import ClientSession
 from decouple import config
 from discord.ext import commands
 
 import src.utils as utils
-from src.plotting import plot_csv
+from src.attachments import AttachmentCache
+from src.dm_channels import DMChannelRegistry
+from src.fingerprints import FingerprintStore
+from src.lazy import LazyModule
 
 logger = logging.getLogger("covid-19")
+plotting = LazyModule("src.plotting")
+
+POLL_INTERVAL     = config("poll_interval", default=300, cast=int)
+POLL_MAX_INTERVAL = config("poll_max_interval", default=1800, cast=int)
+NEWS_INTERVAL     = 3600
+# what to send a subscriber whose country didn't change since its last
+# message: "text" (short text-only message), "skip" or "full"
+UNCHANGED_DELIVERY = config("unchanged_delivery", default="text")
+# consecutive failed deliveries before a subscription is dropped
+TOMBSTONE_AFTER = config("tombstone_after", default=3, cast=int)
 
 
 class AutoUpdater(commands.Cog):
-    __slots__ = ("bot", "interval_update")
+    __slots__ = (
+        "bot",
+        "validators",
+        "news_refreshed",
+        "charts",
+        "dm_channels",
+        "fingerprints",
+        "failures",
+        "task"
+    )
     def __init__(self, bot):
         self.bot = bot
-        self.interval_update = 0
-        self.bot.loop.create_task(self.main())
-        # self.bot.loop.create_task(self.bot._clear_free_conn())
+        self.charts = AttachmentCache(bot)
+        self.dm_channels = DMChannelRegistry(bot, utils.DM_CHANNELS_PATH)
+        self.fingerprints = FingerprintStore(utils.FINGERPRINTS_PATH)
+        self.failures = Counter()
+        self.validators = {}
+        self.news_refreshed = time.time()
+        self.task = None
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if self.task is None:
+            self.task = self.bot.loop.create_task(self.main())
+
+    async def send_chart(self, send, embed, path):
+        url = await self.charts.url_for(path, self.bot.data_version)
+        if url is not None:
+            embed.set_image(url=url)
+            return await send(embed=embed)
+        # no cache channel available, fall back to uploading the chart
+        embed.set_image(url=f'attachment://{path}')
+        return await send(file=await utils.discord_file(path), embed=embed)
+
+    async def send_unchanged(self, send, key, data, report):
+        """Handle a subscriber already holding the current numbers.
+        Returns False when the full message should be sent anyway."""
+        if UNCHANGED_DELIVERY == "full" or not self.fingerprints.unchanged(key, data):
+            return False
+        if UNCHANGED_DELIVERY == "text":
+            since = self.fingerprints.last_update(key)
+            await send(
+                f"No new data for **{data.country}** since your last update "
+                f"({utils.last_update(since)})."
+            )
+            report["text"] += 1
+        else:
+            report["skipped"] += 1
+        return True
+
+    async def delivery_failed(self, key):
+        """Counts a delivery Discord rejected with NotFound or Forbidden
+        (deleted channel, no access, DMs closed) and tombstones the
+        subscription once it failed TOMBSTONE_AFTER cycles in a row."""
+        self.failures[key] += 1
+        if self.failures[key] < TOMBSTONE_AFTER:
+            return
+        del self.failures[key]
+        kind, _id = key
+        if kind == "notification":
+            await self.bot.delete_notif(_id)
+        else:
+            await self.bot.delete_tracker(_id)
+            self.dm_channels.forget(_id)
+        self.fingerprints.forget(key)
+        logger.info(f"{kind} {_id} tombstoned after {TOMBSTONE_AFTER} failed deliveries")
 
     async def send_notifications(self):
-        channels_id = await self.bot.to_send()
+        now = time.time()
+        channels_id = self.bot.subscriptions.due_notifications(now)
         total_history_confirmed = await utils.get(self.bot.http_session, "/history/confirmed/total/")
         total_history_recovered = await utils.get(self.bot.http_session, "/history/recovered/total/")
         total_history_deaths = await utils.get(self.bot.http_session, "/history/deaths/total/")
@@ -37,18 +111,11 @@ class AutoUpdater(commands.Cog):
         history_recovered = await utils.get(self.bot.http_session, "/history/recovered/")
         history_deaths = await utils.get(self.bot.http_session, "/history/deaths/")
 
-        all_data = await utils.get(self.bot.http_session, "/all/")
+        all_data = await utils.get_stats(self.bot.http_session, "/all/")
 
+        report = Counter()
         for guild in channels_id:
-            # go next, didn't match interval for this guild
-            if self.interval_update % guild["next_update"] != 0:
-                continue
             try:
-                embed = discord.Embed(
-                    description=utils.mkheader(),
-                    timestamp=dt.datetime.utcnow(),
-                    color=utils.COLOR
-                )
                 path = utils.STATS_PATH
                 if guild["country"].lower() in ("all", "world"):
                     country = "World"
@@ -60,85 +127,61 @@ class AutoUpdater(commands.Cog):
                 if data is None:
                     continue
 
-                confirmed = data["totalCases"]
-                recovered = data["totalRecovered"]
-                deaths = data["totalDeaths"]
-                active = data["activeCases"]
-                embed.set_author(
-                    name=f"Coronavirus COVID-19 Notification - {data['country']}",
-                    icon_url=f"https://raw.githubusercontent.com/hjnilsson/country-flags/master/png250px/{data['iso2'].lower()}.png"
-                )
-                embed.add_field(
-                    name="<:confirmed:688686089548202004> Confirmed",
-                    value=f"{confirmed:,}"
-                )
-                embed.add_field(
-                    name="<:recov:688686059567185940> Recovered",
-                    value=f"{recovered:,} (**{utils.percentage(confirmed, recovered)}**)"
-                )
-                embed.add_field(
-                    name="<:_death:688686194917244928> Deaths",
-                    value=f"{deaths:,} (**{utils.percentage(confirmed, deaths)}**)"
-                )
-
-                embed.add_field(
-                    name="<:_calendar:692860616930623698> Today confirmed",
-                    value=f"+{data['newCases']:,} (**{utils.percentage(confirmed, data['newCases'])}**)"
-                )
-                embed.add_field(
-                    name="<:_calendar:692860616930623698> Today deaths",
-                    value=f"+{data['newDeaths']:,} (**{utils.percentage(confirmed, data['newDeaths'])}**)"
-                )
-                embed.add_field(
-                    name="<:bed_hospital:692857285499682878> Active",
-                    value=f"{active:,} (**{utils.percentage(confirmed, active)}**)"
-                )
-                embed.add_field(
-                    name="<:critical:752228850091556914> Serious critical",
-                    value=f"{data['seriousCritical']:,} (**{utils.percentage(confirmed, data['seriousCritical'])}**)"
-                )
-                if data["totalTests"]:
-                    percent_pop = ""
-                    if data["population"]:
-                        percent_pop = f"(**{utils.percentage(data['population'], data['totalTests'])}**)"
-
-                    embed.add_field(
-                        name="<:test:752252962532884520> Total test",
-                        value=f"{data['totalTests']:,} {percent_pop}"
-                    )
-
+                key = ("notification", guild["guild_id"])
+                channel = self.bot.get_channel(int(guild["channel_id"]))
+                if channel is None:
+                    # a cache miss during an outage or a shard reconnect
+                    # isn't a failed delivery, deleted channels are left
+                    # to the reconciler
+                    continue
+                if await self.send_unchanged(channel.send, key, data, report):
+                    self.bot.subscriptions.mark_notified(guild["guild_id"], now)
+                    continue
 
+                embed = utils.stats_embed(data, "Notification")
                 if not os.path.exists(path) and country != "World":
-                    await plot_csv(
+                    await plotting.plot_csv(
                         path,
                         utils.get_country_history(history_confirmed, country),
                         utils.get_country_history(history_recovered, country),
                         utils.get_country_history(history_deaths, country))
                 elif not os.path.exists(path):
-                    await plot_csv(
+                    await plotting.plot_csv(
                         path,
                         total_history_confirmed,
                         total_history_recovered,
                         total_history_deaths)
 
 
-                with open(path, "rb") as p:
-                    img = discord.File(p, filename=path)
-                embed.set_image(url=f'attachment://{path}')
                 embed.set_thumbnail(url=self.bot.thumb + str(time.time()))
-                channel = self.bot.get_channel(int(guild["channel_id"]))
                 try:
                     embed.set_footer(
-                        text="coronavirus.jessicoh.com/api/ | " + utils.last_update(all_data[0]['lastUpdate'])
+                        text="coronavirus.jessicoh.com/api/ | " + utils.last_update(all_data[0].last_update)
                     )
                 except Exception as e:
                     pass
-                await channel.send(file=img, embed=embed)
+                await self.send_chart(channel.send, embed, path)
+                self.bot.subscriptions.mark_notified(guild["guild_id"], now)
+                self.fingerprints.record(key, data)
+                self.failures.pop(key, None)
+                report["full"] += 1
+            except (discord.Forbidden, discord.NotFound):
+                await self.delivery_failed(key)
             except Exception as e:
                 pass
-        logger.info("Notifications sent")
+        await self.fingerprints.save()
+        logger.info(
+            f"Notifications sent ({report['full']} full, {report['text']} text-only, "
+            f"{report['skipped']} skipped, {report['text'] + report['skipped']} full sends avoided)"
+        )
 
     async def send_tracker(self):
+        now = time.time()
+        # trackers get at most one DM per TRACKER_INTERVAL, not one per
+        # upstream change
+        tracked = self.bot.subscriptions.due_trackers(now)
+        if not tracked:
+            return
         total_history_confirmed = await utils.get(self.bot.http_session, "/history/confirmed/total/")
         total_history_recovered = await utils.get(self.bot.http_session, "/history/recovered/total/")
         total_history_deaths = await utils.get(self.bot.http_session, "/history/deaths/total/")
@@ -147,15 +190,10 @@ class AutoUpdater(commands.Cog):
         history_recovered = await utils.get(self.bot.http_session, "/history/recovered/")
         history_deaths = await utils.get(self.bot.http_session, "/history/deaths/")
 
-        all_data = await utils.get(self.bot.http_session, "/all/")
-        tracked = await self.bot.send_tracker()
+        all_data = await utils.get_stats(self.bot.http_session, "/all/")
+        report = Counter()
         for t in tracked:
             try:
-                embed = discord.Embed(
-                    description=utils.mkheader(),
-                    timestamp=dt.datetime.utcnow(),
-                    color=utils.COLOR
-                )
                 path = utils.STATS_PATH
                 if t["country"].lower() in ("all", "world"):
                     country = "World"
@@ -166,117 +204,117 @@ class AutoUpdater(commands.Cog):
                 if data is None:
                     continue
 
+                send = functools.partial(self.dm_channels.send, t["user_id"])
+                key = ("tracker", t["user_id"])
+                if await self.send_unchanged(send, key, data, report):
+                    self.bot.subscriptions.mark_tracked(t["user_id"], now)
+                    continue
 
-                confirmed = data["totalCases"]
-                recovered = data["totalRecovered"]
-                deaths = data["totalDeaths"]
-                active = data["activeCases"]
-                embed.set_author(
-                    name=f"Coronavirus COVID-19 Personnal Tracker - {data['country']}",
-                    icon_url=f"https://raw.githubusercontent.com/hjnilsson/country-flags/master/png250px/{data['iso2'].lower()}.png"
-                )
-                embed.add_field(
-                    name="<:confirmed:688686089548202004> Confirmed",
-                    value=f"{confirmed:,}"
-                )
-                embed.add_field(
-                    name="<:recov:688686059567185940> Recovered",
-                    value=f"{recovered:,} (**{utils.percentage(confirmed, recovered)}**)"
-                )
-                embed.add_field(
-                    name="<:_death:688686194917244928> Deaths",
-                    value=f"{deaths:,} (**{utils.percentage(confirmed, deaths)}**)"
-                )
-
-                embed.add_field(
-                    name="<:_calendar:692860616930623698> Today confirmed",
-                    value=f"+{data['newCases']:,} (**{utils.percentage(confirmed, data['newCases'])}**)"
-                )
-                embed.add_field(
-                    name="<:_calendar:692860616930623698> Today deaths",
-                    value=f"+{data['newDeaths']:,} (**{utils.percentage(confirmed, data['newDeaths'])}**)"
-                )
-                embed.add_field(
-                    name="<:bed_hospital:692857285499682878> Active",
-                    value=f"{active:,} (**{utils.percentage(confirmed, active)}**)"
-                )
-                embed.add_field(
-                    name="<:critical:752228850091556914> Serious critical",
-                    value=f"{data['seriousCritical']:,} (**{utils.percentage(confirmed, data['seriousCritical'])}**)"
-                )
-                if data["totalTests"]:
-                    percent_pop = ""
-                    if data["population"]:
-                        percent_pop = f"(**{utils.percentage(data['population'], data['totalTests'])}**)"
-
-                    embed.add_field(
-                        name="<:test:752252962532884520> Total test",
-                        value=f"{data['totalTests']:,} {percent_pop}"
-                    )
-
-
+                embed = utils.stats_embed(data, "Personnal Tracker")
                 if not os.path.exists(path) and country != "World":
-                    await plot_csv(
+                    await plotting.plot_csv(
                         path,
                         utils.get_country_history(history_confirmed, country),
                         utils.get_country_history(history_recovered, country),
                         utils.get_country_history(history_deaths, country))
                 elif not os.path.exists(path):
-                    await plot_csv(
+                    await plotting.plot_csv(
                         path,
                         total_history_confirmed,
                         total_history_recovered,
                         total_history_deaths)
 
-                channel = self.bot.get_user(int(t["user_id"]))
-                with open(path, "rb") as p:
-                    img = discord.File(p, filename=path)
-                embed.set_image(url=f'attachment://{path}')
                 embed.set_thumbnail(url=self.bot.thumb + str(time.time()))
                 try:
                     embed.set_footer(
-                        text="coronavirus.jessicoh.com/api/ | " + utils.last_update(all_data[0]['lastUpdate'])
+                        text="coronavirus.jessicoh.com/api/ | " + utils.last_update(all_data[0].last_update)
                     )
                 except Exception as e:
                     pass
-                await channel.send(file=img, embed=embed)
+                await self.send_chart(send, embed, path)
+                self.bot.subscriptions.mark_tracked(t["user_id"], now)
+                self.fingerprints.record(key, data)
+                self.failures.pop(key, None)
+                report["full"] += 1
+            except (discord.Forbidden, discord.NotFound):
+                await self.delivery_failed(key)
             except Exception as e:
                 pass
-        logger.info("Tracker sent")
+        await self.dm_channels.save()
+        await self.fingerprints.save()
+        logger.info(
+            f"Tracker sent ({report['full']} full, {report['text']} text-only, "
+            f"{report['skipped']} skipped, {report['text'] + report['skipped']} full sends avoided)"
+        )
+
+    async def refresh_news(self):
+        try:
+            news = await utils.fetch(utils.NEWS_URL, self.bot.http_session)
+            self.bot.news = utils.news_digest(news)
+            self.news_refreshed = time.time()
+            # snapshot for the next start, the digest is never read back from it
+            await utils.dump_pickle(utils.NEWS_PATH, news)
+        except Exception as e:
+            logger.exception(e, exc_info=True)
+
+    async def subscriptions_ready(self):
+        if self.bot.subscriptions.loaded:
+            return True
+        try:
+            await self.bot.load_subscriptions()
+        except Exception as e:
+            logger.exception(e, exc_info=True)
+            return False
+        return True
 
     async def main(self):
         if self.bot.auto_update_running:
             return
-        self.bot.news = utils.load_news()
+        self.bot.news = await utils.load_news()
         if self.bot.http_session is None:
             self.bot.http_session = ClientSession(loop=self.bot.loop)
         await self.bot.wait_until_ready()
-        utils.png_clean()
-        starting = True
+        await utils.png_clean()
         self.bot.auto_update_running = True
+        poll = POLL_INTERVAL
         while True:
-            before = time.time()
             try:
-
-                if not starting:
-                    self.interval_update += 1
-                    await utils._write(utils.NEWS_URL, utils.NEWS_PATH, self.bot.http_session)
-                    self.bot.news = utils.load_news()
-                    utils.png_clean()
-
-                    await self.send_notifications()
-                    await self.send_tracker()
+                # probed into a copy, the validators are only kept once the
+                # version they describe is taken, else the next poll is a 304
+                validators = dict(self.validators)
+                last_update = await utils.probe_last_update(
+                    self.bot.http_session,
+                    validators
+                )
+                changed = last_update is not None and last_update != self.bot.data_version
+                if changed and not await self.subscriptions_ready():
+                    # the database can't serve the subscriptions right now,
+                    # keep the old version and validators so the next poll
+                    # retries the cycle
+                    logger.info(f"New data found ({last_update}), fan-out deferred")
+                    poll = POLL_INTERVAL
+                elif changed:
+                    starting = self.bot.data_version is None
+                    self.bot.data_version = last_update
+                    self.validators = validators
+                    poll = POLL_INTERVAL
+                    if not starting:
+                        logger.info(f"New data found ({last_update})")
+                        await self.refresh_news()
+                        await utils.png_clean()
+
+                        await self.send_notifications()
+                        await self.send_tracker()
                 else:
-                    starting = False
-
-
-
-
+                    self.validators = validators
+                    # quiet period, back off up to POLL_MAX_INTERVAL
+                    poll = min(poll * 2, POLL_MAX_INTERVAL)
+                    if time.time() - self.news_refreshed >= NEWS_INTERVAL:
+                        await self.refresh_news()
             except Exception as e:
                 logger.exception(e, exc_info=True)
             finally:
-                after = time.time()
-                await asyncio.sleep(3600 - int(after - before))
+                await asyncio.sleep(poll)
 
 def setup(bot):
     bot.add_cog(AutoUpdater(bot))
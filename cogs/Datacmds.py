@@ -6,17 +6,23 @@ import uuid
 
 import discord
 from discord.ext import commands
-from pymysql.err import IntegrityError
 
 import src.utils as utils
-from src.plotting import PlotEmpty, plot_csv, plot_graph
+from src.lazy import LazyModule
+from src.paginator import Paginator, send_embeds
+from src.regions import RegionStore
+from src.responses import RESPONSES, Rendered
+
+# matplotlib is only imported when the first chart is drawn
+plotting = LazyModule("src.plotting")
 
 
 class Datacmds(commands.Cog):
     """Help commands"""
-    __slots__ = ("bot", "continent_code")
+    __slots__ = ("bot", "continent_code", "regions")
     def __init__(self, bot):
         self.bot = bot
+        self.regions = RegionStore(bot)
         self.continent_code = [
             "af",
             "as",
@@ -29,49 +35,36 @@ class Datacmds(commands.Cog):
     @commands.command(name="list")
     @commands.cooldown(3, 30, commands.BucketType.user)
     async def list_countries(self, ctx):
-        text = ""
-        i = 1
-        data = await utils.get(self.bot.http_session, "/all")
-        text = ""
-        overflow_text = ""
-        embeds = []
+        key = RESPONSES.key("list", (), self.bot.data_version)
+        rendered = RESPONSES.get(key)
+        if rendered is not None:
+            return await rendered.send(self.bot, ctx.channel)
+        data = await utils.get_stats(self.bot.http_session, "/all")
+        paginator = Paginator()
         for c in data:
-            overflow_text += c["country"] + ", "
-            if len(overflow_text) >= utils.DISCORD_LIMIT:
-
-                embed = discord.Embed(
-                    description=text.rstrip(", "),
-                    color=utils.COLOR,
-                    timestamp=utils.discord_timestamp()
-                )
-                text = overflow_text
-                overflow_text = ""
-                embeds.append(embed)
-            text = overflow_text
-
-        if text:
-            embed = discord.Embed(
-                    description=text.rstrip(", "),
-                    color=utils.COLOR,
-                    timestamp=utils.discord_timestamp()
-                )
-
-            embeds.append(embed)
+            paginator.add(c.country + ", ")
+        embeds = utils.page_embeds(page.rstrip(", ") for page in paginator.finish())
 
         for i, _embed in enumerate(embeds):
             _embed.set_author(
                     name=f"All countries affected by Coronavirus COVID-19 - Page {i+1}",
                     icon_url=self.bot.author_thumb
                 )
-            _embed.set_footer(text=utils.last_update(data[0]["lastUpdate"]),
+            _embed.set_footer(text=utils.last_update(data[0].last_update),
                             icon_url=ctx.me.avatar_url)
             _embed.set_thumbnail(url=self.bot.thumb + str(time.time()))
-            await ctx.send(embed=_embed)
+        rendered = Rendered.of(embeds)
+        RESPONSES.set(key, rendered)
+        await rendered.send(self.bot, ctx.channel)
 
     @commands.command(name="info")
     @commands.cooldown(3, 30, commands.BucketType.user)
     async def info(self, ctx):
-        data = await utils.get(self.bot.http_session, "/all")
+        key = RESPONSES.key("info", (), self.bot.data_version)
+        rendered = RESPONSES.get(key)
+        if rendered is not None:
+            return await rendered.send(self.bot, ctx.channel)
+        data = await utils.get_stats(self.bot.http_session, "/all")
 
         text = utils.string_formatting(data)
         embed = discord.Embed(
@@ -86,22 +79,22 @@ class Datacmds(commands.Cog):
             icon_url=self.bot.author_thumb
             )
         embed.set_thumbnail(url=self.bot.thumb + str(time.time()))
-        embed.set_footer(text="coronavirus.jessicoh.com/api | " + utils.last_update(data[0]["lastUpdate"]),
+        embed.set_footer(text="coronavirus.jessicoh.com/api | " + utils.last_update(data[0].last_update),
                         icon_url=ctx.me.avatar_url)
 
         if not os.path.exists(utils.STATS_PATH):
             history_confirmed = await utils.get(self.bot.http_session, f"/history/confirmed/total")
             history_recovered = await utils.get(self.bot.http_session, f"/history/recovered/total")
             history_deaths = await utils.get(self.bot.http_session, f"/history/deaths/total")
-            await plot_csv(
+            await plotting.plot_csv(
                 utils.STATS_PATH,
                 history_confirmed,
                 history_recovered,
                 history_deaths)
-        with open(utils.STATS_PATH, "rb") as p:
-            img = discord.File(p, filename=utils.STATS_PATH)
         embed.set_image(url=f'attachment://{utils.STATS_PATH}')
-        await ctx.send(file=img, embed=embed)
+        rendered = Rendered.of([embed], [(utils.STATS_PATH, await utils.read_bytes(utils.STATS_PATH))])
+        RESPONSES.set(key, rendered)
+        await rendered.send(self.bot, ctx.channel)
 
 
     # @commands.command()
@@ -118,93 +111,82 @@ class Datacmds(commands.Cog):
     @commands.cooldown(5, 30, commands.BucketType.user)
     async def country(self, ctx, *countries):
         if len(countries):
-            data = await utils.get(self.bot.http_session, "/all")
-            embeds = []
-            text = overflow_text = ""
+            data = await utils.get_stats(self.bot.http_session, "/all")
+            paginator = Paginator()
             i = 0
-            stack = []
+            stack = set()
             countries = list(map(lambda x: x.lower(), countries))
             for d in data:
                 for country in countries:
                     bold = "**" if i % 2 == 0 else ""
-                    data_country = d['country'].lower()
+                    data_country = d.country.lower()
                     if (data_country.startswith(country) or \
-                        d['iso2'].lower() == country or \
-                        d['iso3'].lower() == country) \
+                        d.iso2.lower() == country or \
+                        d.iso3.lower() == country) \
                         and data_country not in stack:
-                        overflow_text += f"{bold}{d['country']} : {d['totalCases']:,} confirmed [+{d['newCases']:,}] - {d['totalRecovered']:,} recovered - {d['totalDeaths']:,} deaths [+{d['newDeaths']:,}]{bold}\n"
-                        stack.append(data_country)
+                        paginator.add(f"{bold}{d.country} : {d.total_cases:,} confirmed [+{d.new_cases:,}] - {d.total_recovered:,} recovered - {d.total_deaths:,} deaths [+{d.new_deaths:,}]{bold}\n")
+                        stack.add(data_country)
                         i += 1
-                    if len(overflow_text) >= utils.DISCORD_LIMIT:
-                        embed = discord.Embed(
-                            title="Countries affected",
-                            description=text,
-                            timestamp=utils.discord_timestamp(),
-                            color=utils.COLOR
-                        )
-                        overflow_text = ""
-                    text = overflow_text
-            if text:
-                embed = discord.Embed(
-                    description=text,
-                    timestamp=utils.discord_timestamp(),
-                    color=utils.COLOR
-                )
-                embeds.append(embed)
+            embeds = utils.page_embeds(paginator.finish())
             for i, _embed in enumerate(embeds):
                 _embed.set_author(
                         name=f"Countries affected",
                         icon_url=self.bot.author_thumb
                     )
-                _embed.set_footer(text=f"coronavirus.jessicoh.com/api/ | {utils.last_update(data[0]['lastUpdate'])} | Page {i+1}",
+                _embed.set_footer(text=f"coronavirus.jessicoh.com/api/ | {utils.last_update(data[0].last_update)} | Page {i+1}",
                                 icon_url=ctx.me.avatar_url)
                 _embed.set_thumbnail(url=self.bot.thumb + str(time.time()))
-                await ctx.send(embed=_embed)
+            await send_embeds(self.bot, ctx.channel, embeds)
         else:
             await ctx.send("No country provided")
 
     @commands.command(name="stats", aliases=["stat", "statistic", "s"])
     @commands.cooldown(5, 30, commands.BucketType.user)
     async def stats(self, ctx, *country):
+        key = RESPONSES.key("stats", country, self.bot.data_version)
+        rendered = RESPONSES.get(key)
+        if rendered is not None:
+            return await rendered.send(self.bot, ctx.channel)
         is_log = False
         graph_type = "Linear"
-        embed = discord.Embed(
-                description=utils.mkheader(),
-                timestamp=dt.datetime.utcnow(),
-                color=utils.COLOR
-            )
+        suggested = None
         if len(country) == 1 and country[0].lower() == "log" or not len(country):
-            data = await utils.get(self.bot.http_session, f"/all/world")
+            data = await utils.get_stats(self.bot.http_session, f"/all/world")
+        else:
+            all_data = await utils.get_stats(self.bot.http_session, "/all")
         splited = country
 
         if len(splited) == 1 and splited[0].lower() == "log":
-            embed.set_author(
-                name="Coronavirus COVID-19 logarithmic stats",
-                icon_url=self.bot.author_thumb
-            )
             is_log = True
             path = utils.STATS_LOG_PATH
             graph_type = "Logarithmic"
         elif not len(country):
             path = utils.STATS_PATH
         else:
+            if splited[0].lower() == "log":
+                is_log = True
+                graph_type = "Logarithmic"
+                joined = ' '.join(country[1:]).lower()
+                path = utils.STATS_LOG_PATH
+            else:
+                joined = ' '.join(country).lower()
+                path = utils.STATS_PATH
+            data = utils.get_country(all_data, joined)
+            if data is None:
+                data = utils.suggest_country(all_data, joined)
+                if data is None:
+                    raise utils.CountryNotFound(f"Country `{joined}` not found.")
+                # shown in the embed, never substituted silently
+                suggested = joined
+            # the API only ever sees the canonical name
+            joined = data.country
+            path = data.iso2.lower() + path
             try:
-                if splited[0].lower() == "log":
-                    is_log = True
-
-                    joined = ' '.join(country[1:]).lower()
-                    data = await utils.get(self.bot.http_session, f"/all/{joined}")
-                    path = data["iso2"].lower() + utils.STATS_LOG_PATH
-
-                else:
-                    joined = ' '.join(country).lower()
-                    data = await utils.get(self.bot.http_session, f"/all/{joined}")
-                    path = data["iso2"].lower() + utils.STATS_PATH
                 if not os.path.exists(path):
                     history_confirmed = await utils.get(self.bot.http_session, f"/history/confirmed/{joined}")
                     history_recovered = await utils.get(self.bot.http_session, f"/history/recovered/{joined}")
                     history_deaths = await utils.get(self.bot.http_session, f"/history/deaths/{joined}")
-                    await plot_csv(
+                    await plotting.plot_csv(
                         path,
                         history_confirmed,
                         history_recovered,
@@ -214,76 +196,32 @@ class Datacmds(commands.Cog):
             except Exception as e:
                 path = utils.STATS_PATH
 
-        confirmed = data["totalCases"]
-        recovered = data["totalRecovered"]
-        deaths = data["totalDeaths"]
-        active = data["activeCases"]
-        embed.set_author(
-            name=f"Coronavirus COVID-19 {graph_type} graph - {data['country']}",
-            icon_url=f"https://raw.githubusercontent.com/hjnilsson/country-flags/master/png250px/{data['iso2'].lower()}.png"
-        )
-        embed.add_field(
-            name="<:confirmed:688686089548202004> Confirmed",
-            value=f"{confirmed:,}"
-        )
-        embed.add_field(
-            name="<:recov:688686059567185940> Recovered",
-            value=f"{recovered:,} (**{utils.percentage(confirmed, recovered)}**)"
-        )
-        embed.add_field(
-            name="<:_death:688686194917244928> Deaths",
-            value=f"{deaths:,} (**{utils.percentage(confirmed, deaths)}**)"
-        )
-
-        embed.add_field(
-            name="<:_calendar:692860616930623698> Today confirmed",
-            value=f"+{data['newCases']:,} (**{utils.percentage(confirmed, data['newCases'])}**)"
-        )
-        embed.add_field(
-            name="<:_calendar:692860616930623698> Today deaths",
-            value=f"+{data['newDeaths']:,} (**{utils.percentage(confirmed, data['newDeaths'])}**)"
-        )
-        embed.add_field(
-            name="<:bed_hospital:692857285499682878> Active",
-            value=f"{active:,} (**{utils.percentage(confirmed, active)}**)"
-        )
-        embed.add_field(
-            name="<:critical:752228850091556914> Serious critical",
-            value=f"{data['seriousCritical']:,} (**{utils.percentage(confirmed, data['seriousCritical'])}**)"
-        )
-        if data["totalTests"]:
-            percent_pop = ""
-            if data["population"]:
-                percent_pop = f"(**{utils.percentage(data['population'], data['totalTests'])}**)"
-
-            embed.add_field(
-                name="<:test:752252962532884520> Total test",
-                value=f"{data['totalTests']:,} {percent_pop}"
-            )
+        embed = utils.stats_embed(data, f"{graph_type} graph")
+        if suggested is not None:
+            embed.description += f"No exact match for `{suggested}`, showing **{data.country}**.\n"
 
         if not os.path.exists(path):
             history_confirmed = await utils.get(self.bot.http_session, f"/history/confirmed/total")
             history_recovered = await utils.get(self.bot.http_session, f"/history/recovered/total")
             history_deaths = await utils.get(self.bot.http_session, f"/history/deaths/total")
-            await plot_csv(
+            await plotting.plot_csv(
                 path,
                 history_confirmed,
                 history_recovered,
                 history_deaths,
                 logarithmic=is_log)
 
-        with open(path, "rb") as p:
-            img = discord.File(p, filename=path)
-
         embed.set_footer(
-            text="coronavirus.jessicoh.com/api/ | " + utils.last_update(data["lastUpdate"]),
+            text="coronavirus.jessicoh.com/api/ | " + utils.last_update(data.last_update),
             icon_url=ctx.me.avatar_url
         )
         embed.set_thumbnail(
             url=self.bot.thumb + str(time.time())
         )
         embed.set_image(url=f'attachment://{path}')
-        await ctx.send(file=img, embed=embed)
+        rendered = Rendered.of([embed], [(path, await utils.read_bytes(path))])
+        RESPONSES.set(key, rendered)
+        await rendered.send(self.bot, ctx.channel)
 
     @commands.command(name="graph", aliases=["g"])
     # @commands.cooldown(3, 30, commands.BucketType.user)
@@ -519,15 +457,16 @@ class Datacmds(commands.Cog):
     @commands.cooldown(5, 30, commands.BucketType.user)
     async def notification(self, ctx, *state):
         if len(state):
-            all_data = await utils.get(self.bot.http_session, "/all/")
+            all_data = await utils.get_stats(self.bot.http_session, "/all/")
             country, interval, interval_type = self._unpack_notif(state, "every")
             try:
                 data = utils.get_country(all_data, country)
+                if data is not None and country not in ("all", "disable"):
+                    country = data.country
+                elif data is None and country not in ("all", "disable"):
+                    raise utils.CountryNotFound(utils.country_not_found(all_data, country))
                 try:
-                    await self.bot.insert_notif(str(ctx.guild.id), str(ctx.channel.id), country, interval)
-
-                except IntegrityError:
-                    await self.bot.update_notif(str(ctx.guild.id), str(ctx.channel.id), country, interval)
+                    await self.bot.set_notif(str(ctx.guild.id), str(ctx.channel.id), country, interval)
                 finally:
                     if country != "all":
                         embed = discord.Embed(
@@ -539,7 +478,7 @@ class Datacmds(commands.Cog):
                         )
                         embed.add_field(
                             name="Country",
-                            value=f"**{data['country']}**"
+                            value=f"**{data.country}**"
                         )
                         embed.add_field(
                             name="Next update",
@@ -561,6 +500,11 @@ class Datacmds(commands.Cog):
                             name="Next update",
                             value=f"**{interval//self._convert_interval_type(interval_type)} {interval_type}**"
                         )
+            except utils.CountryNotFound as e:
+                embed = discord.Embed(
+                    title=f"{ctx.prefix}notification",
+                    description=str(e)
+                )
             except Exception as e:
                 embed = discord.Embed(
                     title=f"{ctx.prefix}notification",
@@ -584,7 +528,7 @@ class Datacmds(commands.Cog):
         embed.timestamp = utils.discord_timestamp()
         embed.set_thumbnail(url=self.bot.thumb + str(time.time()))
         embed.set_footer(
-            text="coronavirus.jessicoh.com/api/ | " + utils.last_update(all_data[0]["lastUpdate"]),
+            text="coronavirus.jessicoh.com/api/ | " + utils.last_update(all_data[0].last_update),
             icon_url=ctx.me.avatar_url
         )
         await ctx.send(embed=embed)
@@ -618,26 +562,23 @@ class Datacmds(commands.Cog):
                 pass
         else:
 
-            all_data = await utils.get(self.bot.http_session, "/all/")
+            all_data = await utils.get_stats(self.bot.http_session, "/all/")
             country = ' '.join(country)
             data = utils.get_country(all_data, country)
             if data is not None:
-                try:
-                    await self.bot.insert_tracker(str(ctx.author.id), str(ctx.guild.id),country)
-                except IntegrityError:
-                    await self.bot.update_tracker(str(ctx.author.id), country)
+                await self.bot.set_tracker(str(ctx.author.id), str(ctx.guild.id), data.country)
                 embed = discord.Embed(
-                    description=f"{utils.mkheader()}You will receive stats about {data['country']} in DM",
+                    description=f"{utils.mkheader()}You will receive stats about {data.country} in DM",
                     color=utils.COLOR,
                     timestamp=utils.discord_timestamp()
                 )
                 embed.set_author(
                     name="Tracker has been set up!",
-                    icon_url=f"https://raw.githubusercontent.com/hjnilsson/country-flags/master/png250px/{data['iso2'].lower()}.png"
+                    icon_url=f"https://raw.githubusercontent.com/hjnilsson/country-flags/master/png250px/{data.iso2.lower()}.png"
                 )
             else:
                 embed = discord.Embed(
-                    description="Wrong country selected.",
+                    description=utils.country_not_found(all_data, country),
                     color=utils.COLOR,
                     timestamp=utils.discord_timestamp()
                 )
@@ -655,96 +596,79 @@ class Datacmds(commands.Cog):
     @commands.command(name="region", aliases=["r"])
     @commands.cooldown(5, 30, commands.BucketType.user)
     async def region(self, ctx, *params):
-        if len(params):
-            country, state = utils.parse_state_input(*params)
-            try:
-                if state == "all":
-                    history_confirmed = await utils.get(self.bot.http_session, f"/history/confirmed/{country}/regions")
-                    history_recovered = await utils.get(self.bot.http_session, f"/history/recovered/{country}/regions")
-                    history_deaths = await utils.get(self.bot.http_session, f"/history/deaths/{country}/regions")
-                    embeds = utils.region_format(history_confirmed, history_recovered, history_deaths)
-                    for i, _embed in enumerate(embeds):
-                        _embed.set_author(
-                                name=f"All regions in {country}",
-                                icon_url=self.bot.author_thumb
-                            )
-                        _embed.set_footer(
-                            text=f"coronavirus.jessicoh.com/api/ | Page {i+1}",
-                            icon_url=ctx.me.avatar_url)
-                        _embed.set_thumbnail(url=self.bot.thumb + str(time.time()))
-                        await ctx.send(embed=_embed)
-                    return
-                else:
-                    path = state.lower().replace(" ", "_") + utils.STATS_PATH
-                    history_confirmed = await utils.get(self.bot.http_session, f"/history/confirmed/{country}/{state}")
-                    history_recovered = await utils.get(self.bot.http_session, f"/history/recovered/{country}/{state}")
-                    history_deaths = await utils.get(self.bot.http_session, f"/history/deaths/{country}/{state}")
-                    confirmed = list(history_confirmed["history"].values())[-1]
-                    deaths = list(history_deaths["history"].values())[-1]
-
-                    if country in ("us", "united states", "usa"):
-                        is_us = True
-                        recovered = 0
-                        active = 0
-                    else:
-                        is_us = False
-                        recovered = list(history_recovered["history"].values())[-1]
-                        active = confirmed - (recovered + deaths)
-                    if not os.path.exists(path):
-                        await plot_csv(
-                            path,
-                            history_confirmed,
-                            history_recovered,
-                            history_deaths,
-                            is_us=is_us)
-
-
-                    embed = discord.Embed(
-                        description=utils.mkheader(),
-                        timestamp=dt.datetime.utcnow(),
-                        color=utils.COLOR
-                    )
-                    embed.set_author(
-                        name=f"Coronavirus COVID-19 - {state.capitalize()}",
+        key = RESPONSES.key("region", params, self.bot.data_version)
+        rendered = RESPONSES.get(key)
+        if rendered is not None:
+            return await rendered.send(self.bot, ctx.channel)
+        if not len(params):
+            return await ctx.send("No arguments provided.")
+        country, state = utils.parse_state_input(*params)
+        view = await self.regions.view(country)
+        if state == "all":
+            embeds = utils.page_embeds(view.pages())
+            for i, _embed in enumerate(embeds):
+                _embed.set_author(
+                        name=f"All regions in {country}",
                         icon_url=self.bot.author_thumb
                     )
-                    embed.add_field(
-                        name="<:confirmed:688686089548202004> Confirmed",
-                        value=f"{confirmed:,}"
-                    )
-                    embed.add_field(
-                        name="<:_death:688686194917244928> Deaths",
-                        value=f"{deaths:,} (**{utils.percentage(confirmed, deaths)}**)"
-                    )
-                    if recovered:
-                        embed.add_field(
-                            name="<:recov:688686059567185940> Recovered",
-                            value=f"{recovered:,} (**{utils.percentage(confirmed, recovered)}**)"
-                        )
-                        embed.add_field(
-                            name="<:bed_hospital:692857285499682878> Active",
-                            value=f"{active:,} (**{utils.percentage(confirmed, active)}**)"
-                        )
-
-
-
-            except:
-                raise utils.RegionNotFound("Region not found, it might be possible that the region isn't yet available in the data.")
-        else:
-            return await ctx.send("No arguments provided.")
-
-        with open(path, "rb") as p:
-            img = discord.File(p, filename=path)
+                _embed.set_footer(
+                    text=f"coronavirus.jessicoh.com/api/ | Page {i+1}",
+                    icon_url=ctx.me.avatar_url)
+                _embed.set_thumbnail(url=self.bot.thumb + str(time.time()))
+            rendered = Rendered.of(embeds)
+            RESPONSES.set(key, rendered)
+            return await rendered.send(self.bot, ctx.channel)
+
+        i = view.find(state)
+        if i is None:
+            raise utils.RegionNotFound("Region not found, it might be possible that the region isn't yet available in the data.")
+        confirmed, recovered, deaths, active = view.totals(i)
+        path = state.lower().replace(" ", "_") + utils.STATS_PATH
+        if not os.path.exists(path):
+            await plotting.plot_csv(
+                path,
+                view.history("confirmed", i),
+                view.history("recovered", i),
+                view.history("deaths", i),
+                is_us=view.is_us)
 
+        embed = discord.Embed(
+            description=utils.mkheader(),
+            timestamp=dt.datetime.utcnow(),
+            color=utils.COLOR
+        )
+        embed.set_author(
+            name=f"Coronavirus COVID-19 - {state.capitalize()}",
+            icon_url=self.bot.author_thumb
+        )
+        embed.add_field(
+            name="<:confirmed:688686089548202004> Confirmed",
+            value=f"{confirmed:,}"
+        )
+        embed.add_field(
+            name="<:_death:688686194917244928> Deaths",
+            value=f"{deaths:,} (**{utils.percentage(confirmed, deaths)}**)"
+        )
+        if recovered:
+            embed.add_field(
+                name="<:recov:688686059567185940> Recovered",
+                value=f"{recovered:,} (**{utils.percentage(confirmed, recovered)}**)"
+            )
+            embed.add_field(
+                name="<:bed_hospital:692857285499682878> Active",
+                value=f"{active:,} (**{utils.percentage(confirmed, active)}**)"
+            )
         embed.set_footer(
-            text=f"coronavirus.jessicoh.com/api/ | {list(history_confirmed['history'].keys())[-1]}",
+            text=f"coronavirus.jessicoh.com/api/ | {view.dates[-1] if view.dates else ''}",
             icon_url=ctx.me.avatar_url
         )
         embed.set_thumbnail(
             url=self.bot.thumb + str(time.time())
         )
         embed.set_image(url=f'attachment://{path}')
-        await ctx.send(file=img, embed=embed)
+        rendered = Rendered.of([embed], [(path, await utils.read_bytes(path))])
+        RESPONSES.set(key, rendered)
+        await rendered.send(self.bot, ctx.channel)
 
     @commands.command(name="continent")
     # @commands.cooldown(3, 30, commands.BucketType.user)
@@ -782,7 +706,7 @@ class Datacmds(commands.Cog):
     #             history_confirmed = await utils.get(self.bot.http_session, f"/history/confirmed/{joined}")
     #             history_recovered = await utils.get(self.bot.http_session, f"/history/recovered/{joined}")
     #             history_deaths = await utils.get(self.bot.http_session, f"/history/deaths/{joined}")
-    #             await plot_csv(
+    #             await plotting.plot_csv(
     #                 path,
     #                 history_confirmed,
     #                 history_recovered,
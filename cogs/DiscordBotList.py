@@ -1,4 +1,3 @@
-import dbl
 import discord
 from discord.ext import commands
 from decouple import config
@@ -13,17 +12,27 @@ logger = logging.getLogger("covid-19")
 
 class TopGG(commands.Cog):
     """Handles interactions with the top.gg API"""
-    __slots__ = ("bot", "token", "dblpy")
+    __slots__ = ("bot", "token", "dblpy", "task")
     def __init__(self, bot):
         self.bot = bot
         self.token = config('dbl_token') # set this to your DBL token
-        self.dblpy = dbl.DBLClient(self.bot, self.token)
-        self.bot.loop.create_task(self.update_stats())
+        self.dblpy = None
+        self.task = None
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if self.task is None:
+            import dbl
+            self.dblpy = dbl.DBLClient(self.bot, self.token)
+            self.task = self.bot.loop.create_task(self.update_stats())
 
     async def update_stats(self):
         while True:
             try:
-                await self.dblpy.post_guild_count(shard_count=self.bot.shard_count)
+                await self.dblpy.post_guild_count(
+                    guild_count=self.bot.counters.guilds,
+                    shard_count=self.bot.shard_count
+                )
             except Exception as e:
                 logger.exception(e, exc_info=True)
             await asyncio.sleep(1800)
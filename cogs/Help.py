@@ -1,21 +1,26 @@
 import asyncio
 import discord
 from discord.ext import commands
+import io
+import json
 import os
 import datetime as dt
 import time
 import random
 from discord.ext.commands.core import is_owner
-from pymysql.err import IntegrityError
 
+import src.command_stats as command_stats
 import src.utils as utils
+from src.metrics import METRICS
+from src.profiler import PROFILE_MAX_SECONDS, SamplingProfiler
 
 
 class Help(commands.Cog):
     """Help commands"""
-    __slots__ = ("bot", "_id", "thumb")
+    __slots__ = ("bot", "_id", "thumb", "profiling")
     def __init__(self, bot):
         self.bot = bot
+        self.profiling = False
         self._id = 162200556234866688
         self.thumb = "https://upload.wikimedia.org/wikipedia/commons/thumb/2/26/COVID-19_Outbreak_World_Map.svg/langen-1000px-COVID-19_Outbreak_World_Map.svg.png"
 
@@ -181,8 +186,7 @@ class Help(commands.Cog):
     @commands.command()
     @commands.is_owner()
     async def avatar(self, ctx, fpath):
-        with open(fpath, "rb") as f:
-            await self.bot.user.edit(avatar=f.read())
+        await self.bot.user.edit(avatar=await utils.read_bytes(fpath))
 
     @commands.command(name="about")
     @commands.cooldown(5, 30, commands.BucketType.user)
@@ -204,20 +208,15 @@ class Help(commands.Cog):
         embed.add_field(name="Help command",value=f"`{ctx.prefix}help` or `@mention help`")
         embed.add_field(name="Prefix",value=f"`{ctx.prefix}` or `@mention`")
 
-        nb_users = 0
-        channels = 0
-        for s in self.bot.guilds:
-            nb_users += len(s.members)
-            channels += len(s.channels)
-        data = await utils.get(self.bot.http_session, "/all/world")
-        embed.add_field(name="<:confirmed:688686089548202004> Confirmed", value=data["totalCases"])
-        embed.add_field(name="<:recov:688686059567185940> Recovered", value=data["totalRecovered"])
-        embed.add_field(name="<:_death:688686194917244928> Deaths", value=data["totalDeaths"])
-        embed.add_field(name="<:servers:693053697453850655> Servers", value=len(self.bot.guilds))
-        embed.add_field(name="<:users:693053423494365214> Members", value=nb_users)
-        embed.add_field(name="<:hashtag:693056105076621342> Channels", value=channels)
+        data = await utils.get_stats(self.bot.http_session, "/all/world")
+        embed.add_field(name="<:confirmed:688686089548202004> Confirmed", value=data.total_cases)
+        embed.add_field(name="<:recov:688686059567185940> Recovered", value=data.total_recovered)
+        embed.add_field(name="<:_death:688686194917244928> Deaths", value=data.total_deaths)
+        embed.add_field(name="<:servers:693053697453850655> Servers", value=self.bot.counters.guilds)
+        embed.add_field(name="<:users:693053423494365214> Members", value=self.bot.counters.members)
+        embed.add_field(name="<:hashtag:693056105076621342> Channels", value=self.bot.counters.channels)
         embed.add_field(name="<:stack:693054261512110091> Shards", value=f"{ctx.guild.shard_id + 1}/{self.bot.shard_count}")
-        embed.set_footer(text="Made by Taki#0853 (WIP) " + utils.last_update(data['lastUpdate']),
+        embed.set_footer(text="Made by Taki#0853 (WIP) " + utils.last_update(data.last_update),
                         icon_url=ctx.me.avatar_url)
         await ctx.send(embed=embed)
 
@@ -250,6 +249,76 @@ class Help(commands.Cog):
             await self.bot.pool.clear()
         # print(f"{self.bot.pool.__dict__}")
 
+    @commands.command(name="profile")
+    @commands.is_owner()
+    async def profile(self, ctx, seconds: int = 10, flame=""):
+        """Samples the event loop thread for `seconds` and attaches the
+        hottest functions, plus collapsed stacks with `flame`."""
+        if self.profiling:
+            return await ctx.send("A profile is already running.")
+        seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+        self.profiling = True
+        try:
+            profiler = SamplingProfiler()
+            await ctx.send(f"Profiling the event loop for {seconds}s...")
+            await self.bot.loop.run_in_executor(None, profiler.run, seconds)
+        finally:
+            self.profiling = False
+        files = [discord.File(io.BytesIO(profiler.report().encode()), filename="profile.txt")]
+        if flame == "flame":
+            files.append(discord.File(io.BytesIO(profiler.folded().encode()), filename="profile.folded"))
+        await ctx.send(files=files)
+
+    @commands.command(name="dbstats")
+    @commands.is_owner()
+    async def dbstats(self, ctx, fmt=""):
+        if fmt == "json":
+            dump = json.dumps(METRICS.dump(), indent=2).encode()
+            return await ctx.send(file=discord.File(io.BytesIO(dump), filename="metrics.json"))
+
+        def ms(name, query, q=.95):
+            h = METRICS.histogram(name, query=query)
+            return f"{h.quantile(q) * 1000:.1f}" if h else "-"
+
+        queries = sorted(labels["query"] for labels, _ in METRICS.select("db_queries_total"))
+        lines = [f"{'query':<16}{'count':>7}{'err':>5}{'rows':>8}{'acq p95':>9}{'exec p95':>10}{'fetch p95':>11}"]
+        for query in queries:
+            lines.append(
+                f"{query:<16}"
+                f"{METRICS.counter('db_queries_total', query=query):>7}"
+                f"{METRICS.counter('db_errors_total', query=query):>5}"
+                f"{METRICS.counter('db_rows_total', query=query):>8}"
+                f"{ms('db_acquire_seconds', query):>9}"
+                f"{ms('db_execute_seconds', query):>10}"
+                f"{ms('db_fetch_seconds', query):>11}"
+            )
+        gauges = " | ".join(
+            f"{name[len('db_pool_'):]} {value}"
+            for (name, _), value in sorted(METRICS.gauges.items())
+            if name.startswith("db_pool_")
+        )
+        text = "\n".join(lines)
+        await ctx.send(f"**Pool** {gauges or 'no data'} (times in ms)\n```\n{text}\n```")
+
+    @commands.command(name="cmdstats")
+    @commands.is_owner()
+    async def cmdstats(self, ctx, fmt=""):
+        if fmt == "prometheus":
+            dump = METRICS.prometheus().encode()
+            return await ctx.send(file=discord.File(io.BytesIO(dump), filename="metrics.txt"))
+        lines = [f"{'command':<14}{'calls':>7}{'err%':>6}{'cd%':>6}{'p95':>8}{'api':>8}{'render':>8}{'send':>8}"]
+        for command, calls, errors, cooldowns, p95 in command_stats.summary():
+            lines.append(
+                f"{command:<14}{calls:>7}{errors * 100:>6.1f}{cooldowns * 100:>6.1f}"
+                + "".join(f"{p95[name] * 1000:>8.1f}" for name in ("total", ) + command_stats.PHASES)
+            )
+        shards = {}
+        for labels, value in METRICS.select("command_invocations_total"):
+            shards[labels["shard"]] = shards.get(labels["shard"], 0) + value
+        per_shard = " | ".join(f"#{shard} {n}" for shard, n in sorted(shards.items()))
+        text = "\n".join(lines)
+        await ctx.send(f"**Commands** per shard: {per_shard or 'no data'} (p95 in ms)\n```\n{text}\n```")
+
 
 
     @commands.command(name="ping")
@@ -325,12 +394,8 @@ class Help(commands.Cog):
     @commands.guild_only()
     async def setprefix(self, ctx, prefix=""):
         if len(prefix):
-            try:
-                await self.bot.set_prefix(str(ctx.guild.id), prefix)
-            except IntegrityError:
-                await self.bot.update_prefix(str(ctx.guild.id), prefix)
-            finally:
-                await ctx.send(f"New prefix : `{prefix}`")
+            await self.bot.set_prefix(str(ctx.guild.id), prefix)
+            await ctx.send(f"New prefix : `{prefix}`")
         else:
             await ctx.send(f"Missing prefix arg.\n`{ctx.prefix}setprefix <new_prefix>`")
 
@@ -343,10 +408,7 @@ class Help(commands.Cog):
             timestamp=dt.datetime.utcnow(),
             color=utils.COLOR
         )
-        try:
-            prefix = await self.bot.getg_prefix(ctx.guild.id)
-        except:
-            prefix = "c!"
+        prefix = await self.bot.guild_prefix(ctx.guild.id) or "c!"
         embed.add_field(
             name=f"**{ctx.guild.name}**",
             value=f"`{prefix}`"
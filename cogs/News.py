@@ -18,30 +18,14 @@ class News(commands.Cog):
     @commands.cooldown(3, 30, commands.BucketType.user)
     async def news(self, ctx):
         if self.bot.news is None:
-            self.bot.news = utils.load_news()
+            self.bot.news = await utils.load_news()
         embed = discord.Embed(
             title=":newspaper: Recent news about Coronavirus COVID-19 :newspaper:",
             timestamp=utils.discord_timestamp(),
             color=utils.COLOR
         )
-        sources = []
-        length = 0
-        max_size = 5800
-        for n in self.bot.news["articles"]:
-            source = n["source"]["name"]
-            if source not in sources:
-                sources.append(source)
-            else:
-                continue
-            try:
-                length += len(f"🞄 **{source}** : {n['title']} {n['description']}  [Link]({n['url']})")
-                if length >= max_size:
-                    break
-                embed.add_field(name=f"🞄 **{source}** : {n['title']}",
-                                value=f"{n['description']}  [Link]({n['url']})",
-                                inline=False)
-            except discord.errors.HTTPException:
-                break
+        for name, value in self.bot.news.fields:
+            embed.add_field(name=name, value=value, inline=False)
         embed.set_thumbnail(url="https://avatars2.githubusercontent.com/u/32527401?s=400&v=4")
         embed.set_footer(text="newsapi.org",
                         icon_url=ctx.me.avatar_url)
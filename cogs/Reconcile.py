@@ -0,0 +1,71 @@
+import asyncio
+import logging
+
+from decouple import config
+from discord.ext import commands
+
+logger = logging.getLogger("covid-19")
+
+RECONCILE_INTERVAL = config("reconcile_interval", default=6 * 3600, cast=int)
+
+
+class Reconciler(commands.Cog):
+    """Removes the rows of guilds the bot left while it was offline and
+    notifications pointing to deleted channels."""
+    __slots__ = ("bot", "task")
+    def __init__(self, bot):
+        self.bot = bot
+        self.task = None
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if self.task is None:
+            self.task = self.bot.loop.create_task(self.run())
+
+    def orphans(self):
+        departed = []
+        dead_channels = []
+        guild_ids = set(self.bot.subscriptions.notifications)
+        guild_ids.update(
+            str(guild_id) for guild_id, prefix in self.bot.prefixes.items()
+            if prefix is not None
+        )
+        for guild_id in guild_ids:
+            # disconnected shard or guild outage, the cache is incomplete
+            if not self.bot.guild_reachable(guild_id):
+                continue
+            guild = self.bot.get_guild(int(guild_id))
+            if guild is None:
+                departed.append(guild_id)
+                continue
+            notif = self.bot.subscriptions.notification(guild_id)
+            if notif is not None and guild.get_channel(int(notif["channel_id"])) is None:
+                dead_channels.append(guild_id)
+        return departed, dead_channels
+
+    async def sweep(self):
+        if not self.bot.guilds:
+            # empty guild cache means we're not connected, not that every
+            # guild left
+            return
+        departed, dead_channels = self.orphans()
+        await self.bot.purge_guilds(departed)
+        await self.bot.purge_guilds(dead_channels, tables=("notification", ))
+        logger.info(
+            f"Reconciliation: {len(departed)} departed guilds, "
+            f"{len(dead_channels)} dead notification channels removed"
+        )
+
+    async def run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            try:
+                if self.bot.prefixes_loaded and self.bot.subscriptions.loaded:
+                    await self.sweep()
+            except Exception as e:
+                logger.exception(e, exc_info=True)
+            await asyncio.sleep(RECONCILE_INTERVAL)
+
+
+def setup(bot):
+    bot.add_cog(Reconciler(bot))
@@ -1,9 +1,10 @@
+import time
+
+STARTED = time.perf_counter()
+
 import datetime
-import logging
 import os
 
-
-import aiomysql
 import discord
 from aiohttp import ClientSession
 from decouple import config
@@ -11,21 +12,22 @@ from discord.ext import commands
 from discord.ext.commands import when_mentioned_or
 from discord.utils import find
 
+import src.command_stats as command_stats
+import src.sqlite as sqlite
 import src.utils as utils
-from src.database import Pool
-
-logger = logging.getLogger('covid-19')
-logger.setLevel(logging.DEBUG)
-handler = logging.FileHandler(
-        filename='covid-19.log',
-        encoding='utf-8',
-        mode='w'
-    )
-handler.setFormatter(logging.Formatter(
-        '%(asctime)s:%(levelname)s:%(name)s: %(message)s'
-        )
-    )
-logger.addHandler(handler)
+from src.counters import GuildCounters
+from src.database import (DB_BACKEND, SQLITE_PATH, WRITE_BEHIND, Pool,
+                          PoolTuner, WriteBehind, create_pool)
+from src.exporter import start_exporter
+from src.logs import setup_logging
+from src.startup import StartupReport
+from src.subscriptions import SubscriptionRegistry
+from src.watchdog import LoopWatchdog
+
+STARTUP = StartupReport(STARTED)
+
+logger = setup_logging('covid-19')
+STARTUP.record("imports", STARTUP.since_start())
 
 
 class Covid(commands.AutoShardedBot, Pool):
@@ -35,7 +37,18 @@ class Covid(commands.AutoShardedBot, Pool):
         "author_thumb",
         "news",
         "pool",
-        "auto_update_running"
+        "auto_update_running",
+        "data_version",
+        "prefixes",
+        "prefixes_loaded",
+        "subscriptions",
+        "write_behind",
+        "pool_tuner",
+        "startup",
+        "exporter",
+        "watchdog",
+        "counters",
+        "connected_shards"
     )
     def __init__(self, *args, loop=None, **kwargs):
         super().__init__(
@@ -45,25 +58,51 @@ class Covid(commands.AutoShardedBot, Pool):
             )
         super(Pool, self).__init__()
         self.remove_command("help")
+        self.before_invoke(command_stats.before_invoke)
+        self.after_invoke(command_stats.after_invoke)
+        self._time_rest_calls()
+        self.startup = STARTUP
+        started = time.perf_counter()
         self._load_extensions()
+        self.startup.record("cog load", time.perf_counter() - started)
         self.news = None
         self.http_session = None
         self.pool = None
         self.auto_update_running = False
+        self.data_version = None
+        self.prefixes = {}
+        self.prefixes_loaded = False
+        self.subscriptions = SubscriptionRegistry()
+        self.write_behind = None
+        self.pool_tuner = None
+        self.exporter = None
+        self.watchdog = LoopWatchdog(self.loop)
+        self.counters = GuildCounters()
+        self.connected_shards = set()
         self.thumb = "https://upload.wikimedia.org/wikipedia/commons/thumb/2/26/COVID-19_Outbreak_World_Map.svg/langfr-1000px-COVID-19_Outbreak_World_Map.svg.png?t="
         self.author_thumb = "https://upload.wikimedia.org/wikipedia/commons/thumb/e/ef/International_Flag_of_Planet_Earth.svg/1200px-International_Flag_of_Planet_Earth.svg.png"
         self.loop.create_task(self.init_async())
 
     async def _get_prefix(self, bot, message):
-        try:
-            prefix = await self.getg_prefix(message.guild.id)
-        except:
+        prefix = None
+        if message.guild is not None:
+            prefix = await self.guild_prefix(message.guild.id)
+        if prefix is None:
             if message.content[0:2] == "C!":
                 prefix = "C!"
             else:
                 prefix = "c!"
         return when_mentioned_or(prefix)(bot, message)
 
+    def _time_rest_calls(self):
+        """Charge Discord REST calls made during a command to its send phase."""
+        request = self.http.request
+
+        async def timed_request(route, **kwargs):
+            with command_stats.phase("send"):
+                return await request(route, **kwargs)
+        self.http.request = timed_request
+
     def _load_extensions(self):
         for file in os.listdir("cogs/"):
             try:
@@ -82,7 +121,11 @@ class Covid(commands.AutoShardedBot, Pool):
             except Exception:
                 logger.exception(f"Fail to unload {file}")
 
+    async def on_command(self, ctx):
+        command_stats.invoked(ctx)
+
     async def on_command_error(self, ctx, error):
+        command_stats.failed(ctx, error)
         if isinstance(error, commands.CommandOnCooldown):
             await ctx.send('{} This command is ratelimited, please try again in {:.2f}s'.format(ctx.author.mention, error.retry_after))
         else:
@@ -96,6 +139,9 @@ class Covid(commands.AutoShardedBot, Pool):
             await ctx.send(embed=embed)
 
     async def on_guild_join(self, guild: discord.Guild):
+        # guilds joined before READY are counted by the reset in on_ready
+        if self.counters.ready:
+            self.counters.guild_joined(guild)
         await self.wait_until_ready()
         chan_logger = self.get_channel(692815717078270052)
         try:
@@ -117,19 +163,15 @@ class Covid(commands.AutoShardedBot, Pool):
                 embed.add_field(name = "Source code", value="[Click here](https://github.com/takitsu21/covid-19-tracker)")
                 embed.add_field(name="Help command",value="c!help")
                 embed.add_field(name="Prefix",value="c!")
-                nb_users = 0
-                channels = 0
-                for s in self.guilds:
-                    nb_users += len(s.members)
-                    channels += len(s.channels)
-                embed.add_field(name="<:confirmed:688686089548202004> Confirmed", value=self._data["total"]["confirmed"])
-                embed.add_field(name="<:recov:688686059567185940> Recovered", value=self._data["total"]["recovered"])
-                embed.add_field(name="<:_death:688686194917244928> Deaths", value=self._data["total"]["deaths"])
-                embed.add_field(name="<:servers:693053697453850655> Servers", value=len(self.guilds))
-                embed.add_field(name="<:users:693053423494365214> Members", value=nb_users)
-                embed.add_field(name="<:hashtag:693056105076621342> Channels", value=channels)
-                embed.add_field(name="<:stack:693054261512110091> Shards", value=f"{ctx.guild.shard_id + 1}/{self.bot.shard_count}")
-                embed.set_footer(text="Made by Taki#0853 (WIP) " + utils.last_update(utils.DATA_PATH),
+                data = await utils.get_stats(self.http_session, "/all/world")
+                embed.add_field(name="<:confirmed:688686089548202004> Confirmed", value=data.total_cases)
+                embed.add_field(name="<:recov:688686059567185940> Recovered", value=data.total_recovered)
+                embed.add_field(name="<:_death:688686194917244928> Deaths", value=data.total_deaths)
+                embed.add_field(name="<:servers:693053697453850655> Servers", value=self.counters.guilds)
+                embed.add_field(name="<:users:693053423494365214> Members", value=self.counters.members)
+                embed.add_field(name="<:hashtag:693056105076621342> Channels", value=self.counters.channels)
+                embed.add_field(name="<:stack:693054261512110091> Shards", value=f"{guild.shard_id + 1}/{self.shard_count}")
+                embed.set_footer(text="Made by Taki#0853 (WIP) " + utils.last_update(data.last_update),
                                 icon_url=guild.me.avatar_url)
                 await general.send(embed=embed)
         except:
@@ -153,6 +195,8 @@ class Covid(commands.AutoShardedBot, Pool):
         await chan_logger.send(embed=embed)
 
     async def on_guild_remove(self, guild: discord.Guild):
+        if self.counters.ready:
+            self.counters.guild_removed(guild)
         try:
             await self.delete_notif(guild.id)
         except:
@@ -162,27 +206,76 @@ class Covid(commands.AutoShardedBot, Pool):
         except:
             pass
 
+    async def on_guild_available(self, guild: discord.Guild):
+        # unavailable at READY or back from an outage, on_guild_join
+        # isn't dispatched for either
+        if self.counters.ready:
+            self.counters.guild_joined(guild)
+
+    async def on_guild_unavailable(self, guild: discord.Guild):
+        if self.counters.ready:
+            self.counters.guild_removed(guild)
+
+    async def on_member_join(self, member):
+        self.counters.member_joined(member.guild)
+
+    async def on_member_remove(self, member):
+        self.counters.member_removed(member.guild)
+
+    async def on_guild_channel_create(self, channel):
+        self.counters.channel_created(channel.guild)
+
+    async def on_guild_channel_delete(self, channel):
+        self.counters.channel_deleted(channel.guild)
+
     async def init_async(self):
         if self.http_session is None:
             self.http_session = ClientSession(loop=self.loop)
         if self.pool is None:
+            started = time.perf_counter()
             try:
-                self.pool = await aiomysql.create_pool(
-                        host=config("db_host"),
-                        port=3306,
-                        user=config("db_user"),
-                        password=config("db_token"),
-                        db=config("db_user"),
-                        minsize=5,
-                        maxsize=50,
-                        loop=self.loop,
-                        autocommit=True
-                    )
-                logger.info("pool created")
+                if DB_BACKEND == "sqlite":
+                    self.pool = await sqlite.create_pool(SQLITE_PATH, loop=self.loop)
+                else:
+                    self.pool = await create_pool(self.loop)
+                    self.pool_tuner = PoolTuner(self)
+                    self.pool_tuner.start()
+                self.startup.record("pool creation", time.perf_counter() - started)
+                if WRITE_BEHIND:
+                    self.write_behind = WriteBehind(self)
+                    self.write_behind.start()
+                await self.load_prefixes()
+                await self.load_subscriptions()
             except Exception as e:
                 logger.exception(e, exc_info=True)
 
+    def guild_reachable(self, guild_id) -> bool:
+        """True when the guild cache can be trusted for ``guild_id``: its
+        shard is connected and the guild isn't in an outage. A guild or
+        channel missing from the cache otherwise says nothing."""
+        shard_id = (int(guild_id) >> 22) % (self.shard_count or 1)
+        if shard_id not in self.connected_shards:
+            return False
+        guild = self.get_guild(int(guild_id))
+        return guild is None or not guild.unavailable
+
+    async def on_shard_ready(self, shard_id):
+        self.connected_shards.add(shard_id)
+        self.startup.shard_ready(shard_id)
+
+    async def on_shard_resumed(self, shard_id):
+        self.connected_shards.add(shard_id)
+
+    async def on_shard_disconnect(self, shard_id):
+        self.connected_shards.discard(shard_id)
+
     async def on_ready(self):
+        self.counters.reset(self.guilds)
+        if "ready" not in self.startup.phases:
+            self.startup.record("ready", self.startup.since_start())
+            logger.info(f"startup: {self.startup.summary()}")
+            self.exporter = await start_exporter()
+            self.watchdog.start()
         await self.init_async()
         await self.change_presence(
         activity=discord.Game(
@@ -190,18 +283,22 @@ class Covid(commands.AutoShardedBot, Pool):
             )
         )
 
-    def run(self, token, *args, **kwargs):
+    async def close(self):
+        # Client.run handles KeyboardInterrupt and signals itself and ends
+        # up here, so this is where pending writes get flushed
+        if self.is_closed():
+            return
         try:
-            super().run(token, *args, **kwargs)
-        except KeyboardInterrupt:
-            try:
-                self.loop.run_until_complete(self._close())
-                self.loop.run_until_complete(self.http_session.close())
-                logger.info("Shutting down")
-                exit(0)
-            except Exception as e:
-                logger.exception(e, exc_info=True)
-                exit(1)
+            self.watchdog.stop()
+            await self._close()
+            if self.exporter is not None:
+                await self.exporter.cleanup()
+            if self.http_session is not None:
+                await self.http_session.close()
+            logger.info("Shutting down")
+        except Exception as e:
+            logger.exception(e, exc_info=True)
+        await super().close()
 
 
 if __name__ == "__main__":
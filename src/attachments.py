@@ -0,0 +1,43 @@
+import logging
+
+import discord
+from decouple import config
+
+import src.utils as utils
+
+logger = logging.getLogger("covid-19")
+
+CACHE_CHANNEL_ID = config("cache_channel_id", default=0, cast=int)
+
+
+class AttachmentCache:
+    """Uploads each chart once per data version to a cache channel and
+    hands out the hosted attachment URL for embeds to reference."""
+    __slots__ = ("bot", "channel_id", "_urls")
+
+    def __init__(self, bot, channel_id=CACHE_CHANNEL_ID):
+        self.bot = bot
+        self.channel_id = channel_id
+        self._urls = {}
+
+    async def url_for(self, path, version):
+        """Hosted URL of ``path`` for ``version``, None if it can't be hosted."""
+        cached = self._urls.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        if not self.channel_id:
+            return None
+        channel = self.bot.get_channel(self.channel_id)
+        if channel is None:
+            return None
+        try:
+            message = await channel.send(file=await utils.discord_file(path))
+        except (OSError, discord.HTTPException) as e:
+            logger.exception(e, exc_info=True)
+            return None
+        url = message.attachments[0].url
+        self._urls[path] = (version, url)
+        return url
+
+    def clear(self):
+        self._urls.clear()
@@ -0,0 +1,105 @@
+import contextlib
+import contextvars
+import functools
+import time
+from collections import defaultdict
+
+from discord.ext import commands
+
+from src.metrics import METRICS
+
+PHASES = ("api", "render", "send")
+
+_timer = contextvars.ContextVar("command_timer", default=None)
+
+
+class CommandTimer:
+    __slots__ = ("started", "phases")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = defaultdict(float)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Charge the enclosed time to ``name`` for the running command, if any."""
+    timer = _timer.get()
+    if timer is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.phases[name] += time.perf_counter() - started
+
+
+def timed_phase(name):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with phase(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def shard_of(ctx) -> int:
+    return ctx.guild.shard_id if ctx.guild is not None else 0
+
+
+def command_name(ctx) -> str:
+    return ctx.command.qualified_name if ctx.command is not None else "unknown"
+
+
+def invoked(ctx):
+    METRICS.inc("command_invocations_total", command=command_name(ctx), shard=shard_of(ctx))
+
+
+async def before_invoke(ctx):
+    _timer.set(CommandTimer())
+
+
+async def after_invoke(ctx):
+    timer = _timer.get()
+    if timer is None:
+        return
+    _timer.set(None)
+    command = command_name(ctx)
+    total = time.perf_counter() - timer.started
+    api = timer.phases["api"]
+    send = timer.phases["send"]
+    METRICS.observe("command_seconds", total, command=command, phase="total")
+    METRICS.observe("command_seconds", api, command=command, phase="api")
+    METRICS.observe("command_seconds", max(total - api - send, 0.0), command=command, phase="render")
+    METRICS.observe("command_seconds", send, command=command, phase="send")
+
+
+def failed(ctx, error):
+    labels = {"command": command_name(ctx), "shard": shard_of(ctx)}
+    if isinstance(error, commands.CommandOnCooldown):
+        METRICS.inc("command_cooldowns_total", **labels)
+    else:
+        METRICS.inc("command_errors_total", **labels)
+
+
+def summary():
+    """Per command: invocations, error and cooldown rates and phase p95s."""
+    calls = defaultdict(int)
+    errors = defaultdict(int)
+    cooldowns = defaultdict(int)
+    for store, name in ((calls, "command_invocations_total"),
+                        (errors, "command_errors_total"),
+                        (cooldowns, "command_cooldowns_total")):
+        for labels, value in METRICS.select(name):
+            store[labels["command"]] += value
+    rows = []
+    for command in sorted(calls, key=calls.get, reverse=True):
+        n = calls[command]
+        p95 = {}
+        for name in ("total", ) + PHASES:
+            h = METRICS.histogram("command_seconds", command=command, phase=name)
+            p95[name] = h.quantile(.95) if h else 0.0
+        rows.append((command, n, errors[command] / n, cooldowns[command] / n, p95))
+    return rows
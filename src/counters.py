@@ -0,0 +1,65 @@
+class GuildCounters:
+    """Servers, members and channels across all shards, counted once at
+    READY and then kept up to date from gateway events.
+
+    What each guild added is remembered, so removing a guild takes back
+    exactly that, and a guild counted again (unavailable at READY, back
+    from an outage) replaces its previous numbers instead of adding to
+    them."""
+    __slots__ = ("guilds", "members", "channels", "ready", "_counted")
+
+    def __init__(self):
+        self.guilds = 0
+        self.members = 0
+        self.channels = 0
+        self.ready = False
+        self._counted = {}
+
+    def reset(self, guilds):
+        self.guilds = 0
+        self.members = 0
+        self.channels = 0
+        self._counted.clear()
+        for guild in guilds:
+            self.guild_joined(guild)
+        self.ready = True
+
+    def _add(self, guild_id, members, channels):
+        counted = self._counted.get(guild_id)
+        if counted is None:
+            return
+        self._counted[guild_id] = (counted[0] + members, counted[1] + channels)
+        self.members += members
+        self.channels += channels
+
+    def guild_joined(self, guild):
+        self.guild_removed(guild)
+        if guild.unavailable:
+            # no member count nor channels until it becomes available
+            members, channels = 0, 0
+        else:
+            members, channels = guild.member_count or 0, len(guild.channels)
+        self._counted[guild.id] = (members, channels)
+        self.guilds += 1
+        self.members += members
+        self.channels += channels
+
+    def guild_removed(self, guild):
+        counted = self._counted.pop(guild.id, None)
+        if counted is None:
+            return
+        self.guilds -= 1
+        self.members -= counted[0]
+        self.channels -= counted[1]
+
+    def member_joined(self, guild):
+        self._add(guild.id, 1, 0)
+
+    def member_removed(self, guild):
+        self._add(guild.id, -1, 0)
+
+    def channel_created(self, guild):
+        self._add(guild.id, 0, 1)
+
+    def channel_deleted(self, guild):
+        self._add(guild.id, 0, -1)
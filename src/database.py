@@ -1,10 +1,256 @@
+import asyncio
+import collections
 import logging
+import math
+import time
+from collections import defaultdict
 
 import aiomysql
 from decouple import config
 
+from src.metrics import METRICS
+
 logger = logging.getLogger("covid-19")
 
+# "mysql" or "sqlite" (embedded, see src/sqlite.py)
+DB_BACKEND            = config("db_backend", default="mysql")
+SQLITE_PATH           = config("db_path", default="data/covid.sqlite3")
+
+WRITE_BEHIND          = config("db_write_behind", default=False, cast=bool)
+WRITE_BEHIND_SIZE     = config("db_write_behind_size", default=100, cast=int)
+WRITE_BEHIND_INTERVAL = config("db_write_behind_interval", default=2.0, cast=float)
+
+POOL_MIN_SIZE     = config("db_pool_min", default=5, cast=int)
+POOL_MAX_LOWER    = config("db_pool_max_lower", default=10, cast=int)
+POOL_MAX_UPPER    = config("db_pool_max_upper", default=50, cast=int)
+POOL_TUNE_EVERY   = config("db_pool_tune_interval", default=30, cast=int)
+# an acquire waiting longer than this means the pool is short of connections
+SLOW_ACQUIRE      = config("db_slow_acquire", default=0.05, cast=float)
+
+DB_TIMEOUT        = config("db_timeout", default=2.0, cast=float)
+PREFIX_TIMEOUT    = config("db_prefix_timeout", default=0.25, cast=float)
+FANOUT_TIMEOUT    = config("db_fanout_timeout", default=10.0, cast=float)
+
+PURGE_CHUNK       = config("db_purge_chunk", default=500, cast=int)
+
+
+def pool_gauges(pool, limit=None):
+    METRICS.set("db_pool_size", pool.size)
+    METRICS.set("db_pool_free", pool.freesize)
+    METRICS.set("db_pool_max", limit.limit if limit is not None else pool.maxsize)
+    METRICS.set("db_pool_in_use", pool.size - pool.freesize)
+
+
+async def create_pool(loop, maxsize=POOL_MAX_UPPER):
+    return await aiomysql.create_pool(
+        host=config("db_host"),
+        port=3306,
+        user=config("db_user"),
+        password=config("db_token"),
+        db=config("db_user"),
+        minsize=POOL_MIN_SIZE,
+        maxsize=maxsize,
+        loop=loop,
+        autocommit=True
+    )
+
+
+class PoolLimit:
+    """Resizable cap on the connections checked out at once. aiomysql
+    can't resize a pool, so the pool is created at POOL_MAX_UPPER and the
+    tuner moves this limit instead, which never opens or closes a
+    connection by itself."""
+    __slots__ = ("limit", "in_use", "_waiters")
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self._waiters = collections.deque()
+
+    async def acquire(self):
+        while self.in_use >= self.limit:
+            waiter = asyncio.get_event_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # woken up then cancelled, hand the slot to the next waiter
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+                raise
+        self.in_use += 1
+
+    def release(self):
+        self.in_use -= 1
+        self._wake()
+
+    def resize(self, limit):
+        self.limit = limit
+        self._wake()
+
+    def _wake(self):
+        free = self.limit - self.in_use
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class PoolTuner:
+    """Grows the connection limit when acquires start waiting while most
+    connections are busy, shrinks it back when the pool sits idle."""
+    __slots__ = ("bot", "lower", "upper", "interval", "limit", "_acquires", "_slow", "_peak", "_task")
+
+    def __init__(self, bot, lower=POOL_MAX_LOWER, upper=POOL_MAX_UPPER, interval=POOL_TUNE_EVERY):
+        self.bot = bot
+        self.lower = lower
+        self.upper = upper
+        self.interval = interval
+        self.limit = PoolLimit(upper)
+        self._acquires = 0
+        self._slow = 0
+        self._peak = 0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = self.bot.loop.create_task(self._run())
+
+    def record(self, wait):
+        self._acquires += 1
+        if wait >= SLOW_ACQUIRE:
+            self._slow += 1
+        if self.limit.in_use > self._peak:
+            self._peak = self.limit.in_use
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.adjust()
+            except Exception as e:
+                logger.exception(e, exc_info=True)
+
+    def adjust(self):
+        maxsize = self.limit.limit
+        utilization = self._peak / maxsize if maxsize else 0
+        slow_ratio = self._slow / self._acquires if self._acquires else 0
+        target = maxsize
+        if slow_ratio > .05 and utilization >= .8:
+            target = min(self.upper, math.ceil(maxsize * 1.25))
+        elif utilization < .3 and not self._slow:
+            target = max(self.lower, maxsize - max(1, maxsize // 10))
+        if target != maxsize:
+            self.limit.resize(target)
+            logger.info(f"pool limit {maxsize} -> {target} (peak {self._peak}, slow acquires {slow_ratio:.0%})")
+        self._acquires = self._slow = self._peak = 0
+        pool_gauges(self.bot.pool, self.limit)
+
+
+def _expand(sql, n):
+    """``{}`` in a statement stands for the list of keys of a batched
+    ``IN (...)`` clause."""
+    return sql.format(", ".join(["%s"] * n))
+
+
+class WriteBehind:
+    """Buffers mutations and flushes them on one connection, merging rows
+    of the same statement into multi-row INSERTs / ``IN (...)`` DELETEs.
+
+    Mutations are keyed by the row they touch so a burst on one row
+    collapses into its last write; every queued statement is therefore a
+    full-row upsert or a delete.
+    """
+    __slots__ = ("bot", "max_size", "interval", "timeout", "_pending", "_lock", "_task")
+
+    def __init__(self, bot, max_size=WRITE_BEHIND_SIZE, interval=WRITE_BEHIND_INTERVAL, timeout=FANOUT_TIMEOUT):
+        self.bot = bot
+        self.max_size = max_size
+        self.interval = interval
+        self.timeout = timeout
+        self._pending = {}
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self):
+        if self._task is None:
+            self._task = self.bot.loop.create_task(self._run())
+
+    def add(self, key, sql, args):
+        self._pending[key] = (sql, args)
+        if len(self._pending) >= self.max_size:
+            self.bot.loop.create_task(self._safe_flush())
+
+    async def _safe_flush(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.exception(e, exc_info=True)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._safe_flush()
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            grouped = defaultdict(list)
+            for sql, args in pending.values():
+                grouped[sql].append(args)
+            async def run(conn):
+                async with conn.cursor() as cur:
+                    for sql, rows in grouped.items():
+                        if "{}" in sql:
+                            await cur.execute(
+                                _expand(sql, len(rows)),
+                                [arg for row in rows for arg in row]
+                            )
+                        else:
+                            await cur.executemany(sql, rows)
+                    await cur.close()
+
+            try:
+                pool = self.bot.pool
+                started = time.perf_counter()
+                try:
+                    conn = await self.bot._db_acquire(pool, self.timeout)
+                except asyncio.TimeoutError:
+                    METRICS.inc("db_timeouts_total", query="write_behind", phase="acquire")
+                    raise
+                acquired = time.perf_counter()
+                METRICS.observe("db_acquire_seconds", acquired - started, query="write_behind")
+                try:
+                    await asyncio.wait_for(run(conn), max(self.timeout - (acquired - started), 0.001))
+                except asyncio.TimeoutError:
+                    # the connection is mid-statement, don't hand it back
+                    conn.close()
+                    METRICS.inc("db_timeouts_total", query="write_behind", phase="execute")
+                    raise
+                finally:
+                    self.bot._db_release(pool, conn)
+                METRICS.observe("db_execute_seconds", time.perf_counter() - acquired, query="write_behind")
+                METRICS.inc("db_queries_total", query="write_behind")
+                METRICS.inc("db_write_behind_rows_total", len(pending))
+            except Exception:
+                # keep the writes for the next flush unless newer ones replaced them
+                for key, op in pending.items():
+                    self._pending.setdefault(key, op)
+                raise
+        logger.debug(f"write-behind flushed {len(pending)} rows")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
 
 class Pool:
     # async def _clear_free_conn(self):
@@ -16,103 +262,267 @@ class Pool:
     #             logger.info("connections cleared")
     #         await asyncio.sleep(30)
 
-    async def set_prefix(self, guild_id, prefix):
-        async with self.pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute("INSERT INTO guild_setting(guild_id, prefix) VALUES(%s, %s)", (guild_id, prefix, ))
-                await cur.close()
+    @property
+    def _pool_limit(self):
+        return self.pool_tuner.limit if self.pool_tuner is not None else None
 
-    async def getg_prefix(self, guild_id):
-        async with self.pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute("SELECT prefix FROM guild_setting WHERE guild_id=%s", (guild_id, ))
-                r, = await cur.fetchone()
+    async def _db_acquire(self, pool, timeout):
+        """A connection of ``pool`` within ``timeout``, waiting for a slot
+        under the tuned limit first."""
+        limit = self._pool_limit
+        if limit is None:
+            return await asyncio.wait_for(pool.acquire(), timeout)
+
+        async def acquire():
+            await limit.acquire()
+            try:
+                return await pool.acquire()
+            except BaseException:
+                limit.release()
+                raise
+        return await asyncio.wait_for(acquire(), timeout)
+
+    def _db_release(self, pool, conn):
+        pool.release(conn)
+        if self._pool_limit is not None:
+            self._pool_limit.release()
+
+    async def _query(self, name, sql, args=(), fetch=None, cursor_class=None, timeout=DB_TIMEOUT):
+        """Runs one statement on a pooled connection, recording acquire wait,
+        execute and fetch times and the number of rows returned under
+        ``name``. ``fetch`` is None, "one" or "all".
+
+        Raises asyncio.TimeoutError when acquire + query exceed ``timeout``
+        so callers can fall back instead of holding up the bot."""
+        cursor_args = (cursor_class, ) if cursor_class is not None else ()
+        pool = self.pool
+        started = time.perf_counter()
+        try:
+            conn = await self._db_acquire(pool, timeout)
+        except asyncio.TimeoutError:
+            METRICS.inc("db_timeouts_total", query=name, phase="acquire")
+            raise
+        acquired = time.perf_counter()
+        METRICS.observe("db_acquire_seconds", acquired - started, query=name)
+        pool_gauges(pool, self._pool_limit)
+        if self.pool_tuner is not None:
+            self.pool_tuner.record(acquired - started)
+
+        async def run():
+            async with conn.cursor(*cursor_args) as cur:
+                await cur.execute(sql, args)
+                executed = time.perf_counter()
+                METRICS.observe("db_execute_seconds", executed - acquired, query=name)
+                r = None
+                if fetch == "one":
+                    r = await cur.fetchone()
+                    rows = int(r is not None)
+                elif fetch == "all":
+                    r = await cur.fetchall()
+                    rows = len(r)
+                if fetch is not None:
+                    METRICS.observe("db_fetch_seconds", time.perf_counter() - executed, query=name)
+                    METRICS.inc("db_rows_total", rows, query=name)
                 await cur.close()
+            return r
+
+        try:
+            r = await asyncio.wait_for(run(), max(timeout - (acquired - started), 0.001))
+        except asyncio.TimeoutError:
+            # the connection is mid-query, don't hand it back to the pool
+            conn.close()
+            METRICS.inc("db_timeouts_total", query=name, phase="execute")
+            raise
+        except Exception:
+            METRICS.inc("db_errors_total", query=name)
+            raise
+        finally:
+            self._db_release(pool, conn)
+        METRICS.inc("db_queries_total", query=name)
         return r
 
-    async def update_prefix(self, guild_id, prefix):
-        async with self.pool.acquire() as conn:
+    async def _transaction(self, name, statements, timeout=FANOUT_TIMEOUT):
+        """Runs ``(sql, args)`` statements in one transaction on one connection.
+
+        Raises asyncio.TimeoutError when acquire + transaction exceed
+        ``timeout``, the transaction is then rolled back by closing the
+        connection."""
+        pool = self.pool
+        started = time.perf_counter()
+        try:
+            conn = await self._db_acquire(pool, timeout)
+        except asyncio.TimeoutError:
+            METRICS.inc("db_timeouts_total", query=name, phase="acquire")
+            raise
+        acquired = time.perf_counter()
+        METRICS.observe("db_acquire_seconds", acquired - started, query=name)
+
+        async def run():
+            await conn.begin()
             async with conn.cursor() as cur:
-                await cur.execute("UPDATE guild_setting SET prefix=%s WHERE guild_id=%s", (prefix, guild_id, ))
-                await cur.close()
+                for sql, args in statements:
+                    await cur.execute(sql, args)
+            await conn.commit()
+
+        try:
+            await asyncio.wait_for(run(), max(timeout - (acquired - started), 0.001))
+        except asyncio.TimeoutError:
+            conn.close()
+            METRICS.inc("db_timeouts_total", query=name, phase="execute")
+            raise
+        except Exception:
+            METRICS.inc("db_errors_total", query=name)
+            await conn.rollback()
+            raise
+        finally:
+            self._db_release(pool, conn)
+        METRICS.observe("db_execute_seconds", time.perf_counter() - acquired, query=name)
+        METRICS.inc("db_queries_total", query=name)
+
+    async def _write(self, name, key, sql, args):
+        if self.write_behind is not None:
+            return self.write_behind.add(key, sql, args)
+        await self._query(name, _expand(sql, 1), args)
+
+    async def load_prefixes(self):
+        r = await self._query(
+            "load_prefixes",
+            "SELECT guild_id, prefix FROM guild_setting",
+            fetch="all",
+            timeout=FANOUT_TIMEOUT
+        )
+        self.prefixes = {int(guild_id): prefix for guild_id, prefix in r}
+        self.prefixes_loaded = True
+        logger.info(f"{len(self.prefixes)} guild prefixes loaded")
+
+    async def guild_prefix(self, guild_id):
+        """Cached guild prefix, None when the guild uses the default one."""
+        guild_id = int(guild_id)
+        try:
+            return self.prefixes[guild_id]
+        except KeyError:
+            if self.prefixes_loaded:
+                return None
+        # bulk load not done yet, ask the database and remember the answer
+        try:
+            prefix = await self.getg_prefix(guild_id)
+        except asyncio.TimeoutError:
+            # database is struggling, answer with the default without caching it
+            return None
+        except Exception:
+            prefix = None
+        self.prefixes[guild_id] = prefix
+        return prefix
+
+    async def set_prefix(self, guild_id, prefix):
+        sql = """INSERT INTO guild_setting(guild_id, prefix) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE prefix=VALUES(prefix)"""
+        await self._write("set_prefix", ("guild_setting", str(guild_id)), sql, (guild_id, prefix, ))
+        self.prefixes[int(guild_id)] = prefix
+
+    async def getg_prefix(self, guild_id):
+        r, = await self._query(
+            "getg_prefix",
+            "SELECT prefix FROM guild_setting WHERE guild_id=%s",
+            (guild_id, ),
+            fetch="one",
+            timeout=PREFIX_TIMEOUT
+        )
+        return r
 
     async def delete_prefix(self, guild_id):
-        async with self.pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute("DELETE FROM guild_setting WHERE guild_id=%s", (guild_id, ))
-                await cur.close()
+        sql = "DELETE FROM guild_setting WHERE guild_id IN ({})"
+        await self._write("delete_prefix", ("guild_setting", str(guild_id)), sql, (guild_id, ))
+        self.prefixes[int(guild_id)] = None
 
     async def to_send(self):
-        async with self.pool.acquire() as conn:
-            async with conn.cursor(aiomysql.DictCursor) as cur:
-                await cur.execute("SELECT * FROM notification")
-                r = await cur.fetchall()
-                await cur.close()
-        return r
+        return await self._query(
+            "to_send",
+            "SELECT * FROM notification",
+            fetch="all",
+            cursor_class=aiomysql.DictCursor,
+            timeout=FANOUT_TIMEOUT
+        )
 
-    async def insert_notif(self, guild_id, channel_id, country, next_update):
-        async with self.pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                sql = """INSERT INTO notification(guild_id, channel_id, country, next_update) VALUES(%s, %s, %s, %s)"""
-                await cur.execute(sql, (guild_id, channel_id, country.lower(), next_update, ))
-                await cur.close()
+    async def load_subscriptions(self):
+        self.subscriptions.load(await self.to_send(), await self.send_tracker())
+        logger.info(
+            f"{len(self.subscriptions.notifications)} notifications and "
+            f"{len(self.subscriptions.trackers)} trackers loaded"
+        )
+
+    async def set_notif(self, guild_id, channel_id, country, next_update):
+        sql = """INSERT INTO notification(guild_id, channel_id, country, next_update) VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+        channel_id=VALUES(channel_id),
+        country=VALUES(country),
+        next_update=VALUES(next_update)"""
+        await self._write(
+            "set_notif",
+            ("notification", str(guild_id)),
+            sql,
+            (guild_id, channel_id, country.lower(), next_update, )
+        )
+        self.subscriptions.set_notification(guild_id, channel_id, country, next_update)
 
     async def delete_notif(self, guild_id):
-        async with self.pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute("DELETE FROM notification WHERE guild_id=%s", (guild_id, ))
-                await cur.close()
+        sql = "DELETE FROM notification WHERE guild_id IN ({})"
+        await self._write("delete_notif", ("notification", str(guild_id)), sql, (guild_id, ))
+        self.subscriptions.remove_notification(guild_id)
 
-    async def update_notif(self, guild_id, channel_id, country, next_update):
-        async with self.pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                sql = """UPDATE notification SET
-                channel_id=%s,
-                country=%s,
-                next_update=%s
-                WHERE guild_id=%s"""
-                await cur.execute(sql, (channel_id, country.lower(), next_update, guild_id, ))
-                await cur.close()
+    async def purge_guilds(self, guild_ids, tables=("notification", "guild_setting")):
+        """Bulk deletes the rows of ``guild_ids`` from ``tables``, one
+        transaction per chunk of PURGE_CHUNK guilds."""
+        guild_ids = [str(guild_id) for guild_id in guild_ids]
+        for i in range(0, len(guild_ids), PURGE_CHUNK):
+            chunk = guild_ids[i:i + PURGE_CHUNK]
+            await self._transaction("purge_guilds", [
+                (_expand(f"DELETE FROM {table} WHERE guild_id IN ({{}})", len(chunk)), chunk)
+                for table in tables
+            ])
+            for guild_id in chunk:
+                if "notification" in tables:
+                    self.subscriptions.remove_notification(guild_id)
+                if "guild_setting" in tables:
+                    self.prefixes.pop(int(guild_id), None)
 
-    async def insert_tracker(self, user_id, guild_id, country):
-        async with self.pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                sql = """INSERT INTO notification(guild_id, channel_id, country, next_update) VALUES(%s, %s, %s, %s)"""
-                await cur.execute("INSERT INTO tracker(user_id, guild_id, country) VALUES(%s, %s, %s)", (user_id, guild_id, country, ))
-                await cur.close()
+    async def set_tracker(self, user_id, guild_id, country):
+        sql = """INSERT INTO tracker(user_id, guild_id, country) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+        guild_id=VALUES(guild_id),
+        country=VALUES(country)"""
+        await self._write("set_tracker", ("tracker", str(user_id)), sql, (user_id, guild_id, country, ))
+        self.subscriptions.set_tracker(user_id, guild_id, country)
 
     async def delete_tracker(self, user_id):
-        async with self.pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute("DELETE FROM tracker WHERE user_id=%s", (user_id, ))
-                await cur.close()
-
-    async def update_tracker(self, user_id, country):
-        async with self.pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                sql = """UPDATE tracker SET
-                country=%s
-                WHERE user_id=%s"""
-                await cur.execute(sql, (country, user_id, ))
-                await cur.close()
+        sql = "DELETE FROM tracker WHERE user_id IN ({})"
+        await self._write("delete_tracker", ("tracker", str(user_id)), sql, (user_id, ))
+        self.subscriptions.remove_tracker(user_id)
 
     async def send_tracker(self):
-        async with self.pool.acquire() as conn:
-            async with conn.cursor(aiomysql.DictCursor) as cur:
-                await cur.execute("SELECT * FROM tracker")
-                r = await cur.fetchall()
-                await cur.close()
-        return r
+        return await self._query(
+            "send_tracker",
+            "SELECT * FROM tracker",
+            fetch="all",
+            cursor_class=aiomysql.DictCursor,
+            timeout=FANOUT_TIMEOUT
+        )
 
     async def select_tracker(self, user_id):
-        async with self.pool.acquire() as conn:
-            async with conn.cursor(aiomysql.DictCursor) as cur:
-                await cur.execute("SELECT country FROM tracker WHERE user_id=%s", (user_id, ))
-                r = await cur.fetchone()
-                await cur.close()
-        return r
+        return await self._query(
+            "select_tracker",
+            "SELECT country FROM tracker WHERE user_id=%s",
+            (user_id, ),
+            fetch="one",
+            cursor_class=aiomysql.DictCursor
+        )
 
     async def _close(self):
+        if self.write_behind is not None:
+            try:
+                await self.write_behind.stop()
+            except Exception as e:
+                logger.exception(e, exc_info=True)
         if self.pool:
             self.pool.close()
             await self.pool.wait_closed()
@@ -0,0 +1,78 @@
+import logging
+import pickle
+
+import discord
+
+import src.utils as utils
+
+logger = logging.getLogger("covid-19")
+
+
+class DMChannelRegistry:
+    """Persistent user id -> DM channel id map.
+
+    Messages are posted straight to the stored channel id so the tracker
+    fan-out doesn't open a DM channel (one REST call) per user and cycle.
+    A channel is resolved again only when a send to it fails.
+    """
+    __slots__ = ("bot", "path", "_channels", "_dirty")
+
+    def __init__(self, bot, path):
+        self.bot = bot
+        self.path = path
+        self._channels = self._load()
+        self._dirty = False
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return {}
+
+    async def save(self):
+        if not self._dirty:
+            return
+        try:
+            await utils.write_bytes(self.path, pickle.dumps(self._channels, -1))
+            self._dirty = False
+        except OSError as e:
+            logger.exception(e, exc_info=True)
+
+    def forget(self, user_id):
+        if self._channels.pop(int(user_id), None) is not None:
+            self._dirty = True
+
+    async def _resolve(self, user_id):
+        user = self.bot.get_user(user_id)
+        if user is None:
+            user = await self.bot.fetch_user(user_id)
+        channel = await user.create_dm()
+        self._channels[user_id] = channel.id
+        self._dirty = True
+        return channel.id
+
+    async def _post(self, channel_id, content, embed, file):
+        embed = embed.to_dict() if embed is not None else None
+        if file is not None:
+            return await self.bot.http.send_files(
+                channel_id,
+                files=[file],
+                content=content,
+                embed=embed
+            )
+        return await self.bot.http.send_message(channel_id, content, embed=embed)
+
+    async def send(self, user_id, content=None, *, embed=None, file=None):
+        user_id = int(user_id)
+        channel_id = self._channels.get(user_id)
+        if channel_id is not None:
+            try:
+                return await self._post(channel_id, content, embed, file)
+            except (discord.NotFound, discord.Forbidden):
+                # stale channel, resolve it again below
+                self.forget(user_id)
+                if file is not None:
+                    file.reset()
+        channel_id = await self._resolve(user_id)
+        return await self._post(channel_id, content, embed, file)
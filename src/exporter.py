@@ -0,0 +1,38 @@
+import logging
+
+from aiohttp import web
+from decouple import config
+
+from src.metrics import METRICS
+
+logger = logging.getLogger("covid-19")
+
+METRICS_HOST = config("metrics_host", default="127.0.0.1")
+# 0 disables the endpoint
+METRICS_PORT = config("metrics_port", default=9102, cast=int)
+
+
+async def _metrics(request):
+    return web.Response(
+        body=METRICS.prometheus().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+    )
+
+
+async def start_exporter(host=METRICS_HOST, port=METRICS_PORT):
+    """Serve METRICS on http://host:port/metrics, returns the runner to
+    clean up on shutdown or None when disabled/unavailable."""
+    if not port:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logger.exception(e, exc_info=True)
+        await runner.cleanup()
+        return None
+    logger.info(f"metrics exported on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,65 @@
+import logging
+import pickle
+
+import src.utils as utils
+from src.records import CountryStats
+
+logger = logging.getLogger("covid-19")
+
+FINGERPRINT_KEYS = (
+    "total_cases",
+    "total_recovered",
+    "total_deaths",
+    "active_cases",
+    "new_cases",
+    "new_deaths",
+    "serious_critical",
+    "total_tests"
+)
+
+
+def fingerprint(data: CountryStats) -> int:
+    return hash(tuple(getattr(data, k) for k in FINGERPRINT_KEYS))
+
+
+class FingerprintStore:
+    """Persistent map of subscription -> (fingerprint, lastUpdate) of the
+    last data delivered to it."""
+    __slots__ = ("path", "_last_sent", "_dirty")
+
+    def __init__(self, path):
+        self.path = path
+        self._last_sent = self._load()
+        self._dirty = False
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return {}
+
+    async def save(self):
+        if not self._dirty:
+            return
+        try:
+            await utils.write_bytes(self.path, pickle.dumps(self._last_sent, -1))
+            self._dirty = False
+        except OSError as e:
+            logger.exception(e, exc_info=True)
+
+    def unchanged(self, key, data: CountryStats) -> bool:
+        last = self._last_sent.get(key)
+        return last is not None and last[0] == fingerprint(data)
+
+    def last_update(self, key):
+        last = self._last_sent.get(key)
+        return last[1] if last is not None else None
+
+    def record(self, key, data: CountryStats):
+        self._last_sent[key] = (fingerprint(data), data.last_update)
+        self._dirty = True
+
+    def forget(self, key):
+        if self._last_sent.pop(key, None) is not None:
+            self._dirty = True
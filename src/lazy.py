@@ -0,0 +1,20 @@
+import importlib
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access,
+    keeping heavy imports (matplotlib, numpy, ...) out of startup."""
+    __slots__ = ("_name", "_module")
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule {self._name} ({state})>"
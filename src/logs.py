@@ -0,0 +1,99 @@
+import atexit
+import json
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from decouple import config
+
+LOG_PATH        = config("log_path", default="covid-19.log")
+LOG_LEVEL       = config("log_level", default="DEBUG")
+LOG_MAX_BYTES   = config("log_max_bytes", default=10 * 2 ** 20, cast=int)
+LOG_BACKUPS     = config("log_backups", default=5, cast=int)
+LOG_JSON        = config("log_json", default=False, cast=bool)
+# records allowed per call site and window, 0 disables the limit
+LOG_RATE_LIMIT  = config("log_rate_limit", default=20, cast=int)
+LOG_RATE_WINDOW = config("log_rate_window", default=60.0, cast=float)
+
+FORMAT = '%(asctime)s:%(levelname)s:%(name)s: %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class LocalQueueHandler(QueueHandler):
+    """QueueHandler for a queue that stays in this process. The stock
+    ``prepare`` renders the record and clears ``exc_info`` so it can be
+    pickled, which leaves the listener's formatter nothing but a message
+    with the traceback inlined. Only the message arguments are merged
+    here, since they may change before the listener writes the record."""
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets at most ``rate`` records per call site through each ``window``
+    seconds. The next record let through says how many were dropped.
+    Errors are never dropped."""
+
+    def __init__(self, rate=LOG_RATE_LIMIT, window=LOG_RATE_WINDOW):
+        super().__init__()
+        self.rate = rate
+        self.window = window
+        self._sites = {}
+
+    def filter(self, record):
+        if not self.rate or record.levelno >= logging.ERROR:
+            return True
+        now = time.monotonic()
+        key = (record.pathname, record.lineno, record.levelno)
+        site = self._sites.get(key)
+        if site is None or now - site[0] >= self.window:
+            dropped = site[2] if site is not None else 0
+            self._sites[key] = [now, 1, 0]
+            if dropped:
+                record.msg = f"{record.msg} [{dropped} similar messages suppressed]"
+            return True
+        if site[1] < self.rate:
+            site[1] += 1
+            return True
+        site[2] += 1
+        return False
+
+
+def setup_logging(name="covid-19"):
+    """Log records are queued by the calling thread and written by a
+    background listener, so disk latency never reaches the event loop."""
+    file_handler = RotatingFileHandler(
+        filename=LOG_PATH,
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUPS,
+        encoding='utf-8'
+    )
+    file_handler.setFormatter(JsonFormatter() if LOG_JSON else logging.Formatter(FORMAT))
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, file_handler, respect_handler_level=True)
+    handler = LocalQueueHandler(records)
+    handler.addFilter(RateLimitFilter())
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return logger
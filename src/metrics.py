@@ -0,0 +1,150 @@
+import bisect
+import math
+from collections import defaultdict
+
+# seconds, from sub-millisecond lookups to stalled queries
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile."""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(q * self.count)
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.quantile(.5),
+            "p95": self.quantile(.95),
+            "p99": self.quantile(.99),
+            "buckets": dict(zip(map(str, self.buckets + (math.inf, )), self.counts))
+        }
+
+
+class Metrics:
+    """Process wide histograms, counters and gauges, keyed by name and
+    labels."""
+    __slots__ = ("histograms", "counters", "gauges")
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = defaultdict(int)
+        self.gauges = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        try:
+            histogram = self.histograms[key]
+        except KeyError:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        self.counters[self._key(name, labels)] += value
+
+    def set(self, name, value, **labels):
+        self.gauges[self._key(name, labels)] = value
+
+    def histogram(self, name, **labels):
+        return self.histograms.get(self._key(name, labels))
+
+    def counter(self, name, **labels):
+        return self.counters.get(self._key(name, labels), 0)
+
+    def select(self, name):
+        """(labels, metric) of every series called ``name``."""
+        for store in (self.histograms, self.counters, self.gauges):
+            for (n, labels), metric in store.items():
+                if n == name:
+                    yield dict(labels), metric
+
+    def dump(self):
+        def series(store, convert):
+            return [
+                {"name": name, "labels": dict(labels), "value": convert(metric)}
+                for (name, labels), metric in store.items()
+            ]
+        return {
+            "histograms": series(self.histograms, Histogram.to_dict),
+            "counters": series(self.counters, lambda x: x),
+            "gauges": series(self.gauges, lambda x: x)
+        }
+
+    def prometheus(self) -> str:
+        """Every series in the Prometheus text exposition format."""
+        lines = []
+
+        def ordered(store):
+            return sorted(store.items(), key=lambda item: (item[0][0], str(item[0][1])))
+
+        seen = set()
+
+        def typed(name, kind):
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for store, kind in ((self.counters, "counter"), (self.gauges, "gauge")):
+            for (name, labels), value in ordered(store):
+                typed(name, kind)
+                lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), h in ordered(self.histograms):
+            typed(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(h.buckets + (math.inf, ), h.counts):
+                cumulative += n
+                le = "+Inf" if bound == math.inf else repr(bound)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le), ))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {h.sum}")
+            lines.append(f"{name}_count{_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + pairs + "}"
+
+
+METRICS = Metrics()
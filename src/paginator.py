@@ -0,0 +1,76 @@
+import discord
+from discord.http import Route
+
+DESCRIPTION_LIMIT  = 2 ** 11 # 2048
+MESSAGE_EMBED_SIZE = 6000 # total characters of all embeds in a message
+EMBEDS_PER_MESSAGE = 10
+
+
+class Paginator:
+    """Packs lines into pages of at most ``limit`` characters.
+
+    Lines are appended to a list with a running length, so building N
+    lines costs O(N) instead of re-measuring a growing string each time.
+    """
+    __slots__ = ("limit", "max_pages", "pages", "_lines", "_length")
+
+    def __init__(self, limit=DESCRIPTION_LIMIT, max_pages=None):
+        self.limit = limit
+        self.max_pages = max_pages
+        self.pages = []
+        self._lines = []
+        self._length = 0
+
+    def add(self, line: str) -> bool:
+        """Append a line, False once ``max_pages`` pages are full."""
+        if self._length + len(line) > self.limit and self._lines:
+            if self.max_pages is not None and len(self.pages) + 1 >= self.max_pages:
+                return False
+            self.close_page()
+        self._lines.append(line)
+        self._length += len(line)
+        return True
+
+    def close_page(self):
+        if self._lines:
+            self.pages.append("".join(self._lines))
+            self._lines = []
+            self._length = 0
+
+    def finish(self) -> list:
+        self.close_page()
+        return self.pages
+
+
+def pack_embeds(embeds):
+    """Groups embeds into messages of at most EMBEDS_PER_MESSAGE embeds
+    and MESSAGE_EMBED_SIZE characters."""
+    messages = []
+    current = []
+    size = 0
+    for embed in embeds:
+        length = len(embed)
+        if current and (len(current) == EMBEDS_PER_MESSAGE or size + length > MESSAGE_EMBED_SIZE):
+            messages.append(current)
+            current = []
+            size = 0
+        current.append(embed)
+        size += length
+    if current:
+        messages.append(current)
+    return messages
+
+
+async def send_embeds(bot, channel, embeds):
+    """Send ``embeds`` using as few messages as the limits allow."""
+    for group in pack_embeds(embeds):
+        if len(group) == 1:
+            await channel.send(embed=group[0])
+            continue
+        route = Route("POST", "/channels/{channel_id}/messages", channel_id=channel.id)
+        try:
+            await bot.http.request(route, json={"embeds": [e.to_dict() for e in group]})
+        except discord.HTTPException:
+            # multiple embeds rejected, one message per embed
+            for embed in group:
+                await channel.send(embed=embed)
@@ -0,0 +1,69 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from decouple import config
+
+PROFILE_MAX_SECONDS = config("profile_max_seconds", default=60, cast=int)
+PROFILE_INTERVAL    = config("profile_interval", default=0.005, cast=float)
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the stack of one thread (the event loop) from a background
+    thread. The sampled thread isn't instrumented, so the overhead it sees
+    is one ``sys._current_frames`` call per interval."""
+    __slots__ = ("thread_id", "interval", "stacks", "samples", "elapsed")
+
+    def __init__(self, thread_id=None, interval=PROFILE_INTERVAL):
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+
+    def run(self, seconds):
+        """Blocking, call from a thread other than the sampled one."""
+        started = time.monotonic()
+        deadline = started + min(seconds, PROFILE_MAX_SECONDS)
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    stack.append(frame_name(frame))
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+            time.sleep(self.interval)
+        self.elapsed = time.monotonic() - started
+
+    def folded(self) -> str:
+        """Collapsed stacks, the input format of flamegraph.pl/speedscope."""
+        return "\n".join(
+            f"{';'.join(stack)} {n}" for stack, n in self.stacks.most_common()
+        ) + "\n"
+
+    def report(self, top=40) -> str:
+        cumulative = Counter()
+        own = Counter()
+        for stack, n in self.stacks.items():
+            for name in set(stack):
+                cumulative[name] += n
+            own[stack[-1]] += n
+        total = self.samples or 1
+        lines = [
+            f"{self.samples} samples over {self.elapsed:.1f}s "
+            f"(every {self.interval * 1000:.1f}ms)",
+            "",
+            f"{'cumul%':>7}{'self%':>7}  function"
+        ]
+        for name, n in cumulative.most_common(top):
+            lines.append(f"{n * 100 / total:>7.1f}{own[name] * 100 / total:>7.1f}  {name}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,55 @@
+import json
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    try:
+        import ujson
+        loads = ujson.loads
+    except ImportError:
+        loads = json.loads
+
+
+class CountryStats:
+    """One ``/all`` row, without the per-row dict of the decoded JSON."""
+    __slots__ = (
+        "country",
+        "iso2",
+        "iso3",
+        "total_cases",
+        "new_cases",
+        "total_recovered",
+        "total_deaths",
+        "new_deaths",
+        "active_cases",
+        "serious_critical",
+        "total_tests",
+        "population",
+        "last_update"
+    )
+
+    def __init__(self, row: dict):
+        self.country = row["country"]
+        self.iso2 = row["iso2"]
+        self.iso3 = row["iso3"]
+        self.total_cases = int(row["totalCases"] or 0)
+        self.new_cases = int(row["newCases"] or 0)
+        self.total_recovered = int(row["totalRecovered"] or 0)
+        self.total_deaths = int(row["totalDeaths"] or 0)
+        self.new_deaths = int(row["newDeaths"] or 0)
+        self.active_cases = int(row["activeCases"] or 0)
+        self.serious_critical = int(row["seriousCritical"] or 0)
+        self.total_tests = int(row["totalTests"] or 0)
+        self.population = int(row["population"] or 0)
+        self.last_update = row["lastUpdate"]
+
+    def __repr__(self):
+        return f"<CountryStats {self.country} {self.total_cases}>"
+
+
+def decode(payload):
+    """Records for a decoded ``/all`` (list) or ``/all/<country>`` (dict) payload."""
+    if isinstance(payload, dict):
+        return CountryStats(payload)
+    return [CountryStats(row) for row in payload]
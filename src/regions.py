@@ -0,0 +1,146 @@
+import asyncio
+
+import src.utils as utils
+from src.lazy import LazyModule
+from src.paginator import Paginator
+from src.resolver import normalize
+
+np = LazyModule("numpy")
+
+US_ALIASES     = ("us", "united states", "usa")
+REGION_METRICS = ("confirmed", "recovered", "deaths")
+
+
+def country_key(country) -> str:
+    key = normalize(country)
+    return "us" if key in US_ALIASES else key
+
+
+def _matrix(payload: dict, names: list, days: int):
+    """regions x days int64 matrix, shorter histories right-aligned."""
+    matrix = np.zeros((len(names), days), dtype=np.int64)
+    for i, name in enumerate(names):
+        try:
+            values = list(payload[name]["history"].values())[-days:]
+        except (KeyError, TypeError):
+            continue
+        if values:
+            matrix[i, days - len(values):] = [v or 0 for v in values]
+    return matrix
+
+
+class RegionView:
+    """Regional histories of one country as arrays, with latest totals,
+    the confirmed sort order and a normalized region name index."""
+    __slots__ = (
+        "country",
+        "version",
+        "is_us",
+        "names",
+        "dates",
+        "series",
+        "latest",
+        "order",
+        "index",
+        "_pages"
+    )
+
+    def __init__(self, country, version, confirmed, recovered, deaths):
+        self.country = country
+        self.version = version
+        self.is_us = country_key(country) == "us" or not isinstance(recovered, dict)
+        self.names = list(confirmed)
+        self.dates = list(confirmed[self.names[0]]["history"]) if self.names else []
+        days = len(self.dates)
+        self.series = {}
+        for metric, payload in zip(REGION_METRICS, (confirmed, recovered, deaths)):
+            if isinstance(payload, dict) and not (metric == "recovered" and self.is_us):
+                self.series[metric] = _matrix(payload, self.names, days)
+        if days:
+            self.latest = {metric: m[:, -1] for metric, m in self.series.items()}
+        else:
+            self.latest = {metric: np.zeros(len(self.names), dtype=np.int64) for metric in self.series}
+        self.order = np.argsort(-self.latest["confirmed"], kind="stable")
+        self.index = {normalize(name): i for i, name in enumerate(self.names)}
+        self._pages = None
+
+    def find(self, region):
+        """Row of ``region``, None if this country has no such region."""
+        return self.index.get(normalize(region))
+
+    def totals(self, i):
+        """(confirmed, recovered, deaths, active) of row ``i``."""
+        confirmed = int(self.latest["confirmed"][i])
+        deaths = int(self.latest["deaths"][i])
+        if self.is_us:
+            return confirmed, 0, deaths, 0
+        recovered = int(self.latest["recovered"][i])
+        return confirmed, recovered, deaths, confirmed - (recovered + deaths)
+
+    def history(self, metric, i):
+        """Row ``i`` of ``metric`` in the API's history shape, for plotting."""
+        if metric not in self.series:
+            return None
+        return {"history": dict(zip(self.dates, self.series[metric][i].tolist()))}
+
+    def pages(self):
+        """Description pages of ``c!region all``, biggest regions first."""
+        if self._pages is not None:
+            return self._pages
+        paginator = Paginator()
+        for rank, i in enumerate(self.order):
+            bold = "**" if rank % 2 == 0 else ""
+            confirmed, recovered, deaths, _ = self.totals(i)
+            if self.is_us:
+                paginator.add(f"{bold}{self.names[i]} : {confirmed:,} confirmed - {deaths:,} deaths{bold}\n")
+            else:
+                paginator.add(f"{bold}{self.names[i]} : {confirmed:,} confirmed - {recovered:,} recovered - {deaths:,} deaths{bold}\n")
+        self._pages = paginator.finish()
+        return self._pages
+
+
+class RegionStore:
+    """RegionView per country, built on first use and rebuilt once per
+    data version. A lock only lives while its country is being built, the
+    keys come straight from user input."""
+    __slots__ = ("bot", "_views", "_locks")
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._views = {}
+        self._locks = {}
+
+    def _current(self, key):
+        view = self._views.get(key)
+        if view is not None and view.version == self.bot.data_version:
+            return view
+        return None
+
+    async def view(self, country) -> RegionView:
+        key = country_key(country)
+        view = self._current(key)
+        if view is not None:
+            return view
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                view = self._current(key)
+                if view is not None:
+                    return view
+                version = self.bot.data_version
+                payloads = [
+                    await utils.get(self.bot.http_session, f"/history/{metric}/{country}/regions")
+                    for metric in REGION_METRICS
+                ]
+                if not isinstance(payloads[0], dict) or not payloads[0]:
+                    raise utils.RegionNotFound("Region not found, it might be possible that the region isn't yet available in the data.")
+                view = RegionView(country, version, *payloads)
+                self._views[key] = view
+        finally:
+            # waiters still queued on it re-check the built view first
+            if self._locks.get(key) is lock and not lock.locked():
+                del self._locks[key]
+        return view
+
+    def clear(self):
+        self._views.clear()
@@ -0,0 +1,135 @@
+from collections import Counter, defaultdict
+
+from src.cache import LRUCache
+
+MIN_QUERY_LENGTH = 4
+# trigram candidates re-ranked by edit distance
+CANDIDATES       = 8
+# edits allowed per character of the longer string
+MAX_DISTANCE     = 0.34
+# common names the API doesn't use, mapped to ISO2 codes
+ALIASES = {
+    "america": "us",
+    "united states": "us",
+    "united states of america": "us",
+    "united kingdom": "gb",
+    "great britain": "gb",
+    "england": "gb",
+    "britain": "gb",
+    "south korea": "kr",
+    "korea": "kr",
+    "russia": "ru",
+    "czech republic": "cz",
+    "czechia": "cz",
+    "ivory coast": "ci",
+    "vatican": "va",
+    "emirates": "ae",
+    "drc": "cd",
+    "holland": "nl"
+}
+
+
+def normalize(name) -> str:
+    return " ".join(str(name).lower().replace("_", " ").split())
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Damerau-Levenshtein distance (optimal string alignment), an
+    adjacent transposition counts as one edit."""
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+
+def trigrams(text: str) -> frozenset:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class CountryResolver:
+    """Maps user input to a country row. Names, ISO codes and aliases
+    only ever match exactly; typos get a suggestion from the closest full
+    country name by trigram similarity, which callers show to the user
+    rather than substitute silently."""
+    __slots__ = ("version", "rows", "_exact", "_names", "_grams", "_index")
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.rows = rows
+        self._exact = {}
+        self._names = {}
+        for row in rows:
+            for key in (row.country, row.iso2, row.iso3):
+                if key:
+                    self._exact.setdefault(normalize(key), row)
+            if row.country:
+                self._names.setdefault(normalize(row.country), row)
+        for alias, iso2 in ALIASES.items():
+            row = self._exact.get(iso2)
+            if row is not None:
+                self._exact.setdefault(alias, row)
+        self._grams = {name: trigrams(name) for name in self._names}
+        self._index = defaultdict(list)
+        for name, grams in self._grams.items():
+            for gram in grams:
+                self._index[gram].append(name)
+
+    def candidates(self, query: str):
+        """Full country names sharing the most trigrams with ``query``."""
+        grams = trigrams(query)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._index.get(gram, ()))
+        ranked = sorted(
+            shared.items(),
+            key=lambda item: 2 * item[1] / (len(grams) + len(self._grams[item[0]])),
+            reverse=True
+        )
+        return [name for name, _ in ranked[:CANDIDATES]]
+
+    def closest(self, query: str):
+        """(name, distance, runner-up distance) of the best candidate by
+        edit distance over the longer length, or (None, 1, 1)."""
+        best, score, second = None, 1.0, 1.0
+        for name in self.candidates(query):
+            distance = edit_distance(query, name) / max(len(query), len(name))
+            if distance < score:
+                best, score, second = name, distance, score
+            elif distance < second:
+                second = distance
+        return best, score, second
+
+    def resolve(self, country):
+        """Exact row of ``country``, None on a miss."""
+        return self._exact.get(normalize(country))
+
+    def suggest(self, country):
+        """Row the user most likely meant by ``country``, None unless the
+        best candidate is both close and clearly ahead of the others."""
+        query = normalize(country)
+        if len(query) < MIN_QUERY_LENGTH:
+            return None
+        name, score, second = self.closest(query)
+        # a tie between two names is no suggestion at all
+        if score <= MAX_DISTANCE and score < second:
+            return self._names[name]
+        return None
+
+
+_resolvers = LRUCache(2)
+
+
+def resolver_for(rows) -> CountryResolver:
+    """Resolver over an ``/all`` snapshot, built once per data version."""
+    version = (rows[0].last_update, len(rows)) if rows else None
+    resolver = _resolvers.get(version)
+    if resolver is None:
+        resolver = CountryResolver(rows, version)
+        _resolvers.set(version, resolver)
+    return resolver
@@ -0,0 +1,96 @@
+import io
+from collections import OrderedDict
+from typing import NamedTuple, Tuple
+
+import discord
+from decouple import config
+
+import src.utils as utils
+from src.paginator import send_embeds
+
+RESPONSE_CACHE_SIZE  = config("response_cache_size", default=512, cast=int)
+RESPONSE_CACHE_BYTES = config("response_cache_bytes", default=32 * 2 ** 20, cast=int)
+
+
+class Rendered(NamedTuple):
+    """A finished command response: embed payloads and attachment bytes."""
+    embeds: Tuple[dict, ...]
+    files: Tuple[Tuple[str, bytes], ...]
+    size: int
+
+    @classmethod
+    def of(cls, embeds, files=()):
+        size = sum(len(e) for e in embeds) + sum(len(data) for _, data in files)
+        return cls(tuple(e.to_dict() for e in embeds), tuple(files), size)
+
+    async def send(self, bot, channel):
+        embeds = []
+        for payload in self.embeds:
+            embed = discord.Embed.from_dict(payload)
+            embed.timestamp = utils.discord_timestamp()
+            embeds.append(embed)
+        if self.files:
+            name, data = self.files[0]
+            return await channel.send(
+                file=discord.File(io.BytesIO(data), filename=name),
+                embed=embeds[0]
+            )
+        return await send_embeds(bot, channel, embeds)
+
+
+class ResponseCache:
+    """Rendered responses keyed by (command, normalized arguments, data
+    version), bounded both by entry count and by total size in bytes."""
+    __slots__ = ("maxsize", "maxbytes", "_data", "_bytes", "hits", "misses")
+
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE, maxbytes=RESPONSE_CACHE_BYTES):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(command, args, version):
+        """None when there is no known data version to key on."""
+        if version is None:
+            return None
+        return (command, tuple(" ".join(args).lower().split()), version)
+
+    def get(self, key):
+        if key is None:
+            return None
+        try:
+            entry = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, rendered: Rendered):
+        if key is None:
+            return
+        size = rendered.size
+        if size > self.maxbytes:
+            return
+        old = self._data.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._data[key] = (rendered, size)
+        self._bytes += size
+        while len(self._data) > self.maxsize or self._bytes > self.maxbytes:
+            _, (_, evicted) = self._data.popitem(last=False)
+            self._bytes -= evicted
+
+    def clear(self):
+        self._data.clear()
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+RESPONSES = ResponseCache()
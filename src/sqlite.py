@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("covid-19")
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS guild_setting(
+        guild_id TEXT PRIMARY KEY,
+        prefix TEXT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS notification(
+        guild_id TEXT PRIMARY KEY,
+        channel_id TEXT NOT NULL,
+        country TEXT NOT NULL,
+        next_update INTEGER NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS tracker(
+        user_id TEXT PRIMARY KEY,
+        guild_id TEXT NOT NULL,
+        country TEXT NOT NULL
+    )"""
+)
+
+_VALUES = re.compile(r"VALUES\((\w+)\)")
+# the first inserted column is the primary key of every table upserted
+_KEY    = re.compile(r"INSERT\s+INTO\s+\w+\s*\(\s*(\w+)")
+
+
+def translate(sql):
+    """MySQL statements of ``database.Pool`` to their SQLite equivalent."""
+    sql = sql.replace("%s", "?")
+    if "ON DUPLICATE KEY UPDATE" in sql:
+        head, tail = sql.split("ON DUPLICATE KEY UPDATE", 1)
+        # an explicit conflict target, SQLite < 3.35 rejects upserts without one
+        key = _KEY.search(head).group(1)
+        sql = head + f"ON CONFLICT({key}) DO UPDATE SET" + _VALUES.sub(r"excluded.\1", tail)
+    return sql
+
+
+class Cursor:
+    """The part of an aiomysql cursor used by ``database.Pool``; rows are
+    read inside the worker thread so fetches never touch the database."""
+
+    def __init__(self, conn, as_dict):
+        self._conn = conn
+        self._as_dict = as_dict
+        self._rows = []
+
+    def _execute(self, sql, args, many=False):
+        db = self._conn._db
+        cur = db.executemany(sql, args) if many else db.execute(sql, args)
+        rows = cur.fetchall()
+        if self._as_dict:
+            rows = [dict(row) for row in rows]
+        else:
+            rows = [tuple(row) for row in rows]
+        if not self._conn.in_transaction:
+            db.commit()
+        return rows
+
+    async def execute(self, sql, args=()):
+        self._rows = await self._conn._run(self._execute, translate(sql), tuple(args))
+
+    async def executemany(self, sql, args):
+        self._rows = await self._conn._run(self._execute, translate(sql), list(args), True)
+
+    async def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    async def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    async def close(self):
+        self._rows = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class Connection:
+    def __init__(self, pool):
+        self._pool = pool
+        self.closed = False
+        self.in_transaction = False
+
+    @property
+    def _db(self):
+        return self._pool._db
+
+    def _run(self, fn, *args):
+        return self._pool._loop.run_in_executor(self._pool._executor, fn, *args)
+
+    def cursor(self, cursor_class=None):
+        # any cursor class asked by Pool is aiomysql.DictCursor
+        return Cursor(self, cursor_class is not None)
+
+    async def begin(self):
+        self.in_transaction = True
+
+    async def commit(self):
+        self.in_transaction = False
+        await self._run(self._db.commit)
+
+    async def rollback(self):
+        self.in_transaction = False
+        await self._run(self._db.rollback)
+
+    def close(self):
+        self.closed = True
+
+
+class _Acquire:
+    def __init__(self, pool):
+        self._pool = pool
+        self._conn = None
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+    async def _acquire(self):
+        return await self._pool._acquire()
+
+    async def __aenter__(self):
+        self._conn = await self._acquire()
+        return self._conn
+
+    async def __aexit__(self, *exc):
+        self._pool.release(self._conn)
+
+
+class SQLitePool:
+    """Embedded storage exposing the aiomysql pool surface ``database.Pool``
+    relies on (acquire/release, cursors, size gauges, close).
+
+    A single WAL-mode sqlite3 connection lives in a dedicated worker
+    thread; the handle given out by ``acquire`` only routes statements to
+    it, so the event loop never blocks on disk.
+    """
+
+    def __init__(self, path, loop=None):
+        self.path = path
+        self.minsize = 1
+        self._loop = loop or asyncio.get_event_loop()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._db = None
+        self._used = 0
+        self._closing = False
+        # one handle at a time, so a transaction never interleaves with
+        # statements of another handle on the shared connection
+        self._lock = asyncio.Lock()
+
+    def _open(self):
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            db.execute(statement)
+        db.commit()
+        self._db = db
+
+    @property
+    def size(self):
+        return max(self._used, 1)
+
+    @property
+    def freesize(self):
+        return 0 if self._used else 1
+
+    @property
+    def maxsize(self):
+        return 1
+
+    def acquire(self):
+        return _Acquire(self)
+
+    async def _acquire(self):
+        if self._closing:
+            raise RuntimeError("Cannot acquire connection after closing pool")
+        await self._lock.acquire()
+        self._used += 1
+        return Connection(self)
+
+    def release(self, conn):
+        self._used -= 1
+        self._lock.release()
+
+    async def clear(self):
+        pass
+
+    def close(self):
+        self._closing = True
+
+    async def wait_closed(self):
+        if self._db is not None:
+            await self._loop.run_in_executor(self._executor, self._db.close)
+            self._db = None
+        self._executor.shutdown(wait=True)
+
+
+async def create_pool(path, loop=None):
+    pool = SQLitePool(path, loop=loop)
+    await pool._loop.run_in_executor(pool._executor, pool._open)
+    logger.info(f"sqlite database opened ({path})")
+    return pool
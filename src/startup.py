@@ -0,0 +1,39 @@
+import logging
+import time
+
+from src.metrics import METRICS
+
+logger = logging.getLogger("covid-19")
+
+
+class StartupReport:
+    """Wall-clock duration of each startup phase, logged and exported as
+    ``startup_seconds`` gauges."""
+    __slots__ = ("started", "phases", "shards")
+
+    def __init__(self, started=None):
+        self.started = time.perf_counter() if started is None else started
+        self.phases = {}
+        self.shards = {}
+
+    def since_start(self) -> float:
+        return time.perf_counter() - self.started
+
+    def record(self, phase, seconds):
+        self.phases[phase] = seconds
+        METRICS.set("startup_seconds", seconds, phase=phase)
+        logger.info(f"startup: {phase} took {seconds:.3f}s")
+
+    def shard_ready(self, shard_id):
+        """Time to the first READY of ``shard_id``, later READYs are ignored."""
+        if shard_id in self.shards:
+            return
+        seconds = self.since_start()
+        self.shards[shard_id] = seconds
+        METRICS.set("startup_shard_ready_seconds", seconds, shard=shard_id)
+        logger.info(f"startup: shard {shard_id} ready after {seconds:.3f}s")
+
+    def summary(self) -> str:
+        phases = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases.items())
+        shards = ", ".join(f"#{shard_id} {seconds:.3f}s" for shard_id, seconds in sorted(self.shards.items()))
+        return f"phases: {phases or '-'} | first READY per shard: {shards or '-'}"
@@ -0,0 +1,157 @@
+import heapq
+import time
+
+from decouple import config
+
+# tolerance so a guild notified every N hours isn't pushed back a whole
+# upstream refresh when the data lands a few minutes early
+NOTIFY_SLACK = 300
+# minimum time between two tracker DMs to the same user
+TRACKER_INTERVAL = config("tracker_interval", default=3600, cast=int)
+
+
+class DueSchedule:
+    """Due time per key with a min-heap over it, so a fan-out cycle only
+    touches the keys that are due. Rescheduling pushes a new entry,
+    entries that no longer match ``due`` are dropped when they reach the
+    top."""
+    __slots__ = ("due", "_heap")
+
+    def __init__(self):
+        self.due = {}
+        self._heap = []
+
+    def __contains__(self, key):
+        return key in self.due
+
+    def schedule(self, key, due):
+        self.due[key] = due
+        heapq.heappush(self._heap, (due, key))
+        if len(self._heap) > 2 * len(self.due) + 64:
+            # too many stale entries, rebuild from the live schedule
+            self._heap = [(due, key) for key, due in self.due.items()]
+            heapq.heapify(self._heap)
+
+    def remove(self, key):
+        self.due.pop(key, None)
+
+    def pop_due(self, now):
+        """Keys due at ``now``. They stay due until rescheduled."""
+        due = {}
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if self.due.get(entry[1]) == entry[0]:
+                due[entry[1]] = entry
+        for entry in due.values():
+            heapq.heappush(self._heap, entry)
+        return list(due)
+
+
+class SubscriptionRegistry:
+    """In-process mirror of the ``notification`` and ``tracker`` tables.
+
+    Loaded once at startup and kept in sync by the ``Pool`` mutations, so
+    the fan-out and commands never have to re-read the tables.
+    Ids are kept as strings, like they are stored in MySQL.
+    """
+    __slots__ = (
+        "notifications",
+        "trackers",
+        "next_due",
+        "tracker_due",
+        "loaded"
+    )
+
+    def __init__(self):
+        self.notifications = {}
+        self.trackers = {}
+        self.next_due = DueSchedule()
+        self.tracker_due = DueSchedule()
+        self.loaded = False
+
+    def load(self, notifications, trackers):
+        self.__init__()
+        now = time.time()
+        # the last delivery isn't stored, so a restart counts as one: guilds
+        # on daily or weekly intervals don't get an extra post per deploy
+        for n in notifications:
+            self.set_notification(
+                n["guild_id"], n["channel_id"], n["country"], n["next_update"],
+                due=now + int(n["next_update"]) * 3600 - NOTIFY_SLACK
+            )
+        for t in trackers:
+            self.set_tracker(t["user_id"], t["guild_id"], t["country"], due=now + TRACKER_INTERVAL)
+        self.loaded = True
+
+    def set_notification(self, guild_id, channel_id, country, next_update, due=0):
+        guild_id = str(guild_id)
+        self.remove_notification(guild_id, keep_schedule=True)
+        row = {
+            "guild_id": guild_id,
+            "channel_id": str(channel_id),
+            "country": country.lower(),
+            "next_update": int(next_update)
+        }
+        self.notifications[guild_id] = row
+        if guild_id not in self.next_due:
+            self.next_due.schedule(guild_id, due)
+
+    def remove_notification(self, guild_id, keep_schedule=False):
+        guild_id = str(guild_id)
+        self.notifications.pop(guild_id, None)
+        if not keep_schedule:
+            self.next_due.remove(guild_id)
+
+    def due_notifications(self, now=None):
+        """Rows due at ``now``. They stay due until ``mark_notified``."""
+        now = now or time.time()
+        return [
+            self.notifications[guild_id]
+            for guild_id in self.next_due.pop_due(now)
+            if guild_id in self.notifications
+        ]
+
+    def mark_notified(self, guild_id, now=None):
+        guild_id = str(guild_id)
+        row = self.notifications.get(guild_id)
+        if row is not None:
+            now = now or time.time()
+            self.next_due.schedule(guild_id, now + row["next_update"] * 3600 - NOTIFY_SLACK)
+
+    def set_tracker(self, user_id, guild_id, country, due=0):
+        user_id = str(user_id)
+        self.trackers.pop(user_id, None)
+        row = {
+            "user_id": user_id,
+            "guild_id": str(guild_id),
+            "country": country
+        }
+        self.trackers[user_id] = row
+        if user_id not in self.tracker_due:
+            self.tracker_due.schedule(user_id, due)
+
+    def remove_tracker(self, user_id):
+        user_id = str(user_id)
+        self.trackers.pop(user_id, None)
+        self.tracker_due.remove(user_id)
+
+    def due_trackers(self, now=None):
+        """Rows due at ``now``. They stay due until ``mark_tracked``."""
+        now = now or time.time()
+        return [
+            self.trackers[user_id]
+            for user_id in self.tracker_due.pop_due(now)
+            if user_id in self.trackers
+        ]
+
+    def mark_tracked(self, user_id, now=None):
+        user_id = str(user_id)
+        if user_id in self.trackers:
+            now = now or time.time()
+            self.tracker_due.schedule(user_id, now + TRACKER_INTERVAL - NOTIFY_SLACK)
+
+    def tracker(self, user_id):
+        return self.trackers.get(str(user_id))
+
+    def notification(self, guild_id):
+        return self.notifications.get(str(guild_id))
@@ -2,12 +2,14 @@ import asyncio
 import csv
 import datetime as dt
 import functools
+import io
 import json
 import logging
 import os
 import pickle
 import time
-from typing import IO, Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Dict, List, NamedTuple, Tuple
 
 import aiofiles
 import discord
@@ -15,6 +17,13 @@ from aiohttp import ClientSession
 from decouple import config
 from discord.ext import commands
 
+import src.records as records
+from src.cache import LRUCache
+from src.command_stats import timed_phase
+from src.paginator import Paginator
+from src.records import CountryStats
+from src.resolver import resolver_for
+
 
 logger = logging.getLogger("covid-19")
 
@@ -22,6 +31,8 @@ URI_DATA      = config("uri_data")
 DATA_PATH     = "data/datas.pickle"
 CSV_DATA_PATH = "data/parsed_csv.json"
 NEWS_PATH     = "data/news.pickle"
+DM_CHANNELS_PATH = "data/dm_channels.pickle"
+FINGERPRINTS_PATH = "data/fingerprints.pickle"
 POP_PATH      = "data/populations.csv"
 BACKUP_PATH   = "backup/datas.json"
 API_ROOT = config("api_root")
@@ -31,12 +42,19 @@ COLOR                    = 0xd6b360
 DISCORD_LIMIT            = 2 ** 11 # 2048
 MAX_SIZE_FIELD_VALUE     = 2 ** 10 # 1024
 MAX_MAX_SIZE_FIELD_VALUE = 5000 # max embed size
+MAX_SIZE_FIELD_NAME      = 2 ** 8 # 256
+NEWS_MAX_SIZE            = 5800
 
 USER_AGENT      = {'User-Agent': 'Mozilla/5.0 (X11; Linux i586; rv:31.0) Gecko/20100101 Firefox/73.0'}
 STATS_PATH      = "stats.png"
 STATS_LOG_PATH  = "log_stats.png"
 
 MAX_RETRIES = 10
+STATS_EMBED_CACHE_SIZE = config("stats_embed_cache_size", default=1024, cast=int)
+FLAG_URL = "https://raw.githubusercontent.com/hjnilsson/country-flags/master/png250px/{}.png"
+IO_WORKERS  = config("io_workers", default=2, cast=int)
+# keeps disk access off the event loop and out of the default executor
+IO_EXECUTOR = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="covid-io")
 
 class CountryNotFound(Exception):
     pass
@@ -62,13 +80,40 @@ def iteritems(d):
     for k in d.keys():
         yield k, d[k]
 
-def load_news():
-    with open(NEWS_PATH, 'rb') as f:
+async def run_io(func, *args, **kwargs):
+    """Run blocking filesystem work on the I/O thread pool."""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(IO_EXECUTOR, functools.partial(func, *args, **kwargs))
+
+async def read_bytes(path):
+    async with aiofiles.open(path, "rb", executor=IO_EXECUTOR) as f:
+        return await f.read()
+
+async def write_bytes(path, data: bytes):
+    """Write through a temporary file so readers never see a partial file."""
+    tmp = f"{path}.tmp"
+    async with aiofiles.open(tmp, "wb", executor=IO_EXECUTOR) as f:
+        await f.write(data)
+    await run_io(os.replace, tmp, path)
+
+async def discord_file(path, filename=None):
+    """``discord.File`` over the file's bytes, read without blocking."""
+    data = await read_bytes(path)
+    return discord.File(io.BytesIO(data), filename=filename or path)
+
+def _unpickle(path):
+    with open(path, 'rb') as f:
         return pickle.load(f)
 
-def load_pickle():
-    with open(DATA_PATH, 'rb') as f:
-        return pickle.load(f)
+async def dump_pickle(path, obj):
+    await write_bytes(path, pickle.dumps(obj, -1))
+
+async def load_news():
+    """News digest from the last snapshot on disk, used at startup only."""
+    return news_digest(await run_io(_unpickle, NEWS_PATH))
+
+async def load_pickle():
+    return await run_io(_unpickle, DATA_PATH)
 
 def load_populations():
     d = {}
@@ -79,35 +124,31 @@ def load_populations():
         return d
 
 def string_formatting(dataset: list, param: list=[]) -> str:
-    max_length = DISCORD_LIMIT - 50
-    overflow_string = ""
-    rows = ""
-    truncated = ""
     header = mkheader()
-    header_length = len(header)
-    param_length = len(param)
-    bold = ""
+    paginator = Paginator(limit=DISCORD_LIMIT - 50 - len(header), max_pages=1)
     for i, d in enumerate(dataset, start=1):
         bold = "**" if i % 2 == 0 else ""
-        total_cases = f"{d['totalCases']:,}".replace(",", " ")
-        new_cases = f"{d['newCases']:,}".replace(",", " ")
-        truncated = d['country'][0:15] + "..." if len(d['country']) >= 18 \
-            else d['country']
-
-        overflow_string += f"{bold}{truncated} : {total_cases} [+{new_cases}]{bold}\n"
-
-        if (len(overflow_string) + header_length) >= max_length:
+        total_cases = f"{d.total_cases:,}".replace(",", " ")
+        new_cases = f"{d.new_cases:,}".replace(",", " ")
+        truncated = d.country[0:15] + "..." if len(d.country) >= 18 \
+            else d.country
+        if not paginator.add(f"{bold}{truncated} : {total_cases} [+{new_cases}]{bold}\n"):
             break
-        rows = overflow_string
-    return header + rows
+    return header + "".join(paginator.finish())
 
 def get_country(data, country):
-    country = country.lower()
-    for d in data:
-        if country in \
-        (d['country'].lower(), d['iso2'].lower(), d['iso3'].lower()):
-            return d
-    return None
+    """Row of ``country`` in an ``/all`` snapshot, exact matches only."""
+    return resolver_for(data).resolve(country)
+
+def suggest_country(data, country):
+    """Row the user probably meant by a mistyped ``country``, or None."""
+    return resolver_for(data).suggest(country)
+
+def country_not_found(data, country) -> str:
+    suggestion = suggest_country(data, country)
+    if suggestion is None:
+        return f"Country `{country}` not found."
+    return f"Country `{country}` not found, did you mean `{suggestion.country}`?"
 
 def trigger_typing(func):
     @functools.wraps(func)
@@ -154,72 +195,117 @@ def human_format(num: int) -> str:
         pass
     return '{}{}'.format(int(num), ['', 'K', 'M', 'G', 'T', 'P'][magnitude])
 
-def region_format(confirmed, recovered, deaths):
-    overflow_text = text = ""
-    header = mkheader()
-    header_length = len(header)
-    embeds = []
-    i = 0
-    if type(recovered) == int:
-        for c, d in zip(confirmed, deaths):
-            bold = "**" if i % 2 == 0 else ""
-            total_cases = list(confirmed[c]["history"].values())[-1]
-            total_deaths = list(deaths[d]["history"].values())[-1]
-            overflow_text += f"{bold}{c} : {total_cases:,} confirmed - {total_deaths:,} deaths{bold}\n"
-            if (len(overflow_text) + header_length) >= DISCORD_LIMIT:
-                embed = discord.Embed(
-                    description=text,
-                    color=COLOR,
-                    timestamp=discord_timestamp()
-                )
-                text = overflow_text
-                overflow_text = ""
-                embeds.append(embed)
-            text = overflow_text
-            i += 1
-    else:
-        for c, r, d in zip(confirmed, recovered, deaths):
-            bold = "**" if i % 2 == 0 else ""
-            total_cases = list(confirmed[c]["history"].values())[-1]
-            try:
-                total_recovered = list(recovered[r]["history"].values())[-1]
-            except Exception as e:
-                total_recovered = 0
-            total_deaths = list(deaths[d]["history"].values())[-1]
-            overflow_text += f"{bold}{c} : {total_cases:,} confirmed - {total_recovered:,} recovered - {total_deaths:,} deaths{bold}\n"
-            if (len(overflow_text) + header_length) >= DISCORD_LIMIT:
-                embed = discord.Embed(
-                    description=text,
-                    color=COLOR,
-                    timestamp=discord_timestamp()
-                )
-                text = overflow_text
-                overflow_text = ""
-                embeds.append(embed)
-            text = overflow_text
-            i += 1
-    if text:
-        embed = discord.Embed(
-                description=text,
-                color=COLOR,
-                timestamp=discord_timestamp()
-            )
-
-        embeds.append(embed)
-    return embeds
-
+def page_embeds(pages):
+    return [
+        discord.Embed(
+            description=page,
+            color=COLOR,
+            timestamp=discord_timestamp()
+        ) for page in pages
+    ]
 
 def mkheader():
     header = "You can support me on <:kofi:693473314433138718>[Kofi](https://ko-fi.com/takitsu) and vote on [top.gg](https://top.gg/bot/682946560417333283/vote) for the bot. <:github:693519776022003742> [Source code](https://github.com/takitsu21/covid-19-tracker), <:api:752610700177965146> [API](https://coronavirus.jessicoh.com/api/) the bot is using.\n\n"
     return header
 
 
-def png_clean():
+class StatsPayload(NamedTuple):
+    author: str
+    icon_url: str
+    fields: Tuple[Tuple[str, str], ...]
+
+
+_stats_payloads = LRUCache(STATS_EMBED_CACHE_SIZE)
+
+
+class NewsDigest(NamedTuple):
+    fields: Tuple[Tuple[str, str], ...]
+
+
+def news_digest(news: dict) -> NewsDigest:
+    """One article per source, bounded to fit in a single embed.
+    Built once per news refresh so ``c!news`` only reads memory."""
+    sources = set()
+    fields = []
+    length = 0
+    for n in news["articles"]:
+        source = n["source"]["name"]
+        if source in sources:
+            continue
+        sources.add(source)
+        name = f"🞄 **{source}** : {n['title']}"
+        value = f"{n['description']}  [Link]({n['url']})"
+        length += len(name) + len(value) + 1
+        if length >= NEWS_MAX_SIZE:
+            break
+        fields.append((name[:MAX_SIZE_FIELD_NAME], value[:MAX_SIZE_FIELD_VALUE]))
+    return NewsDigest(tuple(fields))
+
+
+def stats_payload(data: CountryStats, variant: str) -> StatsPayload:
+    """Immutable stats embed content for a country row, memoized per
+    (country, data version, variant)."""
+    key = (data.country, data.last_update, variant)
+    payload = _stats_payloads.get(key)
+    if payload is not None:
+        return payload
+    confirmed = data.total_cases
+    recovered = data.total_recovered
+    deaths = data.total_deaths
+    active = data.active_cases
+    fields = [
+        ("<:confirmed:688686089548202004> Confirmed",
+            f"{confirmed:,}"),
+        ("<:recov:688686059567185940> Recovered",
+            f"{recovered:,} (**{percentage(confirmed, recovered)}**)"),
+        ("<:_death:688686194917244928> Deaths",
+            f"{deaths:,} (**{percentage(confirmed, deaths)}**)"),
+        ("<:_calendar:692860616930623698> Today confirmed",
+            f"+{data.new_cases:,} (**{percentage(confirmed, data.new_cases)}**)"),
+        ("<:_calendar:692860616930623698> Today deaths",
+            f"+{data.new_deaths:,} (**{percentage(confirmed, data.new_deaths)}**)"),
+        ("<:bed_hospital:692857285499682878> Active",
+            f"{active:,} (**{percentage(confirmed, active)}**)"),
+        ("<:critical:752228850091556914> Serious critical",
+            f"{data.serious_critical:,} (**{percentage(confirmed, data.serious_critical)}**)")
+    ]
+    if data.total_tests:
+        percent_pop = ""
+        if data.population:
+            percent_pop = f"(**{percentage(data.population, data.total_tests)}**)"
+        fields.append(("<:test:752252962532884520> Total test",
+            f"{data.total_tests:,} {percent_pop}"))
+    payload = StatsPayload(
+        author=f"Coronavirus COVID-19 {variant} - {data.country}",
+        icon_url=FLAG_URL.format(data.iso2.lower()),
+        fields=tuple(fields)
+    )
+    _stats_payloads.set(key, payload)
+    return payload
+
+def stats_embed(data: CountryStats, variant: str) -> discord.Embed:
+    payload = stats_payload(data, variant)
+    embed = discord.Embed(
+        description=mkheader(),
+        timestamp=dt.datetime.utcnow(),
+        color=COLOR
+    )
+    embed.set_author(name=payload.author, icon_url=payload.icon_url)
+    for name, value in payload.fields:
+        embed.add_field(name=name, value=value)
+    return embed
+
+
+def _png_clean():
     for file in os.listdir("."):
         if file.endswith("png"):
             os.remove(file)
 
-async def get(session: ClientSession, endpoint, **kwargs):
+async def png_clean():
+    await run_io(_png_clean)
+
+@timed_phase("api")
+async def get(session: ClientSession, endpoint, loads=json.loads, **kwargs):
     url = API_ROOT + endpoint
     resp = await session.request(
             method="GET",
@@ -239,9 +325,38 @@ async def get(session: ClientSession, endpoint, **kwargs):
         await asyncio.sleep(1)
     if resp.status not in range(200, 300):
         return resp.status
-    data = await resp.json()
+    data = await resp.json(loads=loads)
     return data
 
+async def get_stats(session: ClientSession, endpoint="/all"):
+    """``/all`` endpoints decoded straight into CountryStats records,
+    or the HTTP status on failure like ``get``."""
+    data = await get(session, endpoint, loads=records.loads)
+    if isinstance(data, int):
+        return data
+    return records.decode(data)
+
+async def probe_last_update(session: ClientSession, validators: dict):
+    """Cheap check of the upstream data version.
+
+    ``validators`` keeps the ETag/Last-Modified of the previous answer
+    between calls so the server can reply 304 when nothing changed.
+    Returns the ``lastUpdate`` timestamp or None if unchanged/unavailable.
+    """
+    headers = {"Authorization": config("Authorization")}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    async with session.get(API_ROOT + "/all/world", headers=headers) as resp:
+        if resp.status == 304 or resp.status not in range(200, 300):
+            return None
+        validators["etag"] = resp.headers.get("ETag")
+        validators["last_modified"] = resp.headers.get("Last-Modified")
+        data = await resp.json()
+    return data["lastUpdate"]
+
+@timed_phase("api")
 async def fetch(url: str, session: ClientSession, **kwargs):
     resp = await session.request(
         method="GET",
@@ -256,7 +371,7 @@ async def fetch(url: str, session: ClientSession, **kwargs):
                 url=url,
                 **kwargs
             )
-            logger.info(resp.status)
+            logger.debug(resp.status)
         except Exception as e:
             logger.exception(e, exc_info=True)
     data = await resp.json()
@@ -265,7 +380,6 @@ async def fetch(url: str, session: ClientSession, **kwargs):
 async def _write(url:str, file: IO, session: ClientSession, **kwargs):
     try:
         fetcher = await fetch(url=url, session=session, **kwargs)
-        with open(file, 'wb') as f:
-            pickle.dump(fetcher, f, -1)
+        await dump_pickle(file, fetcher)
     except Exception as e:
         logger.exception(e, exc_info=True)
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from decouple import config
+
+from src.metrics import METRICS
+
+logger = logging.getLogger("covid-19")
+
+LAG_INTERVAL  = config("loop_lag_interval", default=0.5, cast=float)
+LAG_THRESHOLD = config("loop_lag_threshold", default=0.25, cast=float)
+
+
+class LoopWatchdog:
+    """Measures event loop scheduling lag and, while the loop is stalled
+    longer than ``threshold``, logs the stack of the loop thread so the
+    blocking call is caught in the act."""
+    __slots__ = (
+        "loop",
+        "interval",
+        "threshold",
+        "thread_id",
+        "stalls",
+        "_beat",
+        "_task",
+        "_thread",
+        "_running"
+    )
+
+    def __init__(self, loop, interval=LAG_INTERVAL, threshold=LAG_THRESHOLD):
+        self.loop = loop
+        self.interval = interval
+        self.threshold = threshold
+        self.thread_id = None
+        self.stalls = 0
+        self._beat = time.monotonic()
+        self._task = None
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """Call from the loop thread."""
+        if self._running:
+            return
+        self._running = True
+        self.thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = self.loop.create_task(self._measure())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _measure(self):
+        while self._running:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+            self._beat = now
+            METRICS.observe("loop_lag_seconds", lag)
+            METRICS.set("loop_lag_last_seconds", lag)
+            if lag >= self.threshold:
+                logger.info(f"Event loop lag {lag:.3f}s")
+
+    def _watch(self):
+        captured = None
+        while self._running:
+            time.sleep(self.threshold / 2)
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.threshold or captured == beat:
+                continue
+            # one capture per stall, the beat moves once the loop is back
+            captured = beat
+            self.stalls += 1
+            METRICS.inc("loop_stalls_total")
+            frame = sys._current_frames().get(self.thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "unavailable\n"
+            logger.warning(
+                f"Event loop blocked for {stalled:.3f}s+ (stall #{self.stalls}), "
+                f"loop thread stack:\n{stack}"
+            )